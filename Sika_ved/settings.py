@@ -50,6 +50,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core_app.replica.ReplicaPinMiddleware',
+    'core_app.fragment_cache.FragmentTimingMiddleware',
 ]
 
 ROOT_URLCONF = 'Sika_ved.urls'
@@ -65,6 +67,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core_app.context_processors.currency',
             ],
         },
     },
@@ -80,9 +83,49 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections between requests, so the one opened at boot (see
+        # WARM_UP_STEPS) is reused; SIKA_CONN_MAX_AGE=0 closes them after each request
+        'CONN_MAX_AGE': int(os.environ.get('SIKA_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Optional read replica for dashboard and report reads (core_app.replica).
+# Locally, point SIKA_REPLICA_DB at a second SQLite file and keep it fresh with
+# `manage.py refresh_replica`; when unset every query goes to 'default'.
+if os.environ.get('SIKA_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['SIKA_REPLICA_DB'],
+        'CONN_MAX_AGE': int(os.environ.get('SIKA_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core_app.replica.ReplicaRouter']
+
+# After a request that writes, the user's next request reads from 'default'
+# (the pin cookie expires after this many seconds if no request follows)
+REPLICA_PIN_SECONDS = 60
+
+# Cached dashboard/report sections, the data version stamps behind them and the
+# ETags (core_app.data_version), and the category cache's stamp must be seen by
+# every worker process: with a per-process cache a write handled by one worker
+# leaves the others serving stale pages. The file cache needs no server; set
+# SIKA_CACHE_DIR to a directory all workers share, or use Redis/Memcached when
+# they run on several hosts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('SIKA_CACHE_DIR', BASE_DIR / '.cache'),
+        # Culling a version stamp only costs a re-render, never a stale page
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    }
+}
+
+# Upper bound on how long a cached dashboard/report section is kept; entries
+# normally go stale earlier, when the user's data version changes
+FRAGMENT_CACHE_SECONDS = 60 * 60 * 24
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -121,9 +164,50 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATICFILES_DIRS=[os.path.join(BASE_DIR,'static')]
 
+# Format of the charts in PDF reports. 'png' renders fastest; 'svg' keeps them
+# as vectors and makes the PDF about a third of the size, but converting dense
+# charts slows the render down.
+PDF_CHART_FORMAT = 'png'
+
 MEDIA_URL= '/media/'
 MEDIA_ROOT=BASE_DIR/'media'
 
+# Currencies users can record transactions in (code -> display symbol).
+# ExchangeRate rows are expressed in DEFAULT_CURRENCY.
+DEFAULT_CURRENCY = 'INR'
+CURRENCIES = {
+    'INR': '₹',
+    'NPR': 'रू',
+    'USD': '$',
+    'EUR': '€',
+    'GBP': '£',
+    'AUD': 'A$',
+    'JPY': '¥',
+}
+
+# Transactions older than this many months are moved to MEDIA_ROOT/archive
+# by `manage.py archive_transactions`; their totals stay in ArchivedSummary.
+ARCHIVE_AFTER_MONTHS = 24
+
+# Largest number of operations accepted by one /app/api/transactions/batch/ request
+BATCH_WRITE_MAX_OPERATIONS = 100
+
+# Deleted transactions stay as sync tombstones for this many days; clients whose
+# change cursor is older must do a full resync (`manage.py purge_tombstones`).
+SYNC_TOMBSTONE_DAYS = 90
+SYNC_PAGE_SIZE = 200
+# The change feed holds back rows stamped this recently, so a transaction that
+# commits after a later-stamped one is not skipped by the cursor.
+SYNC_SETTLE_SECONDS = 5
+
+# Work done by core_app.warmup when a worker boots (Sika_ved.wsgi imports it,
+# Sika_ved.asgi runs it on the lifespan startup event), so the first request
+# is not the one that imports the views, compiles templates, loads matplotlib's
+# fonts and connects to the database. Off under DEBUG to keep runserver
+# reloads quick. Drop 'database' when the app is preloaded before forking.
+WARM_UP_ON_BOOT = not DEBUG
+WARM_UP_STEPS = ['urls', 'templates', 'charts', 'pdf', 'database', 'categories']
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -1,5 +1,16 @@
 from django.contrib import admin
-from .models import Category, Expense, Income
+from .category_cache import categories
+from .models import (
+    ArchivedSummary, Category, CategoryBudget, CategorySpend, CategoryStat, CurrencyPreference, ExchangeRate,
+    Expense, IdempotencyKey, Income, RecurringRule,
+)
+
+
+@admin.display(description='Category', ordering='category__name')
+def category_name(obj):
+    """Category column served from the in-process category cache instead of a join per row."""
+    return categories.name(obj.category_id, '-')
+
 
 # ========== Expense Category ==========
 @admin.register(Category)
@@ -11,8 +22,8 @@ class CategoryAdmin(admin.ModelAdmin):
 # ========== Expense ==========
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'category', 'amount', 'date', 'description')
-    list_filter = ('category', 'date')
+    list_display = ('id', 'user', category_name, 'amount', 'currency', 'date', 'description', 'is_anomaly')
+    list_filter = ('category', 'currency', 'date', 'is_anomaly')
     search_fields = ('user__username', 'description')
     ordering = ('-date',)
 
@@ -20,7 +31,73 @@ class ExpenseAdmin(admin.ModelAdmin):
 # ========== Income ==========
 @admin.register(Income)
 class IncomeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'amount', 'description', 'date')  # ✅ Added description
-    list_filter = ('date',)
+    list_display = ('id', 'user', 'amount', 'currency', 'description', 'date')  # ✅ Added description
+    list_filter = ('currency', 'date')
     search_fields = ('user__username', 'description')
     ordering = ('-date',)
+
+
+# ========== Category Stats ==========
+@admin.register(CategoryStat)
+class CategoryStatAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', category_name, 'count', 'mean', 'm2')
+    search_fields = ('user__username',)
+    readonly_fields = ('count', 'mean', 'm2')
+
+
+# ========== Recurring Rules ==========
+@admin.register(RecurringRule)
+class RecurringRuleAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'kind', category_name, 'amount', 'frequency', 'interval', 'next_run', 'active')
+    list_filter = ('kind', 'frequency', 'active')
+    search_fields = ('user__username', 'description')
+    ordering = ('next_run',)
+
+
+# ========== Category Budgets ==========
+@admin.register(CategoryBudget)
+class CategoryBudgetAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', category_name, 'monthly_limit')
+    list_filter = ('category',)
+    search_fields = ('user__username',)
+
+
+@admin.register(CategorySpend)
+class CategorySpendAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', category_name, 'month', 'spent')
+    list_filter = ('category', 'month')
+    search_fields = ('user__username',)
+    readonly_fields = ('spent',)
+
+
+# ========== Archived Summaries ==========
+@admin.register(ArchivedSummary)
+class ArchivedSummaryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'kind', category_name, 'date', 'amount', 'currency', 'count')
+    list_filter = ('kind', 'category')
+    search_fields = ('user__username',)
+    ordering = ('-date',)
+
+
+# ========== Idempotency Keys ==========
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'key', 'created_at')
+    search_fields = ('user__username', 'key')
+    ordering = ('-created_at',)
+
+
+# ========== Exchange Rates ==========
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ('id', 'currency', 'date', 'rate')
+    list_filter = ('currency',)
+    ordering = ('-date', 'currency')
+
+
+# ========== Currency Preferences ==========
+@admin.register(CurrencyPreference)
+class CurrencyPreferenceAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'base_currency')
+    list_filter = ('base_currency',)
+    search_fields = ('user__username',)
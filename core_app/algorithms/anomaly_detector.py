@@ -0,0 +1,210 @@
+from django.db import transaction
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from core_app.currency import in_base_currency
+from core_app.models import Category, CategoryStat, Expense
+
+
+class AnomalyDetector:
+    """
+    Online outlier detection for expenses.
+
+    Keeps a running mean/variance per (user, category) in ``CategoryStat`` and
+    flags an expense when it sits more than ``threshold`` standard deviations
+    above the category mean at the time it is written. Amounts are in the
+    user's base currency: callers set ``base_amount`` (see core_app.currency).
+    """
+
+    THRESHOLD = 3.0
+    MIN_SAMPLES = 5
+
+    def __init__(self, user, threshold=THRESHOLD, min_samples=MIN_SAMPLES):
+        """
+        :param user: owner of the expenses being recorded
+        :param threshold: z-score above which an expense is flagged
+        :param min_samples: number of prior expenses needed before flagging
+        """
+        self.user = user
+        self.threshold = threshold
+        self.min_samples = min_samples
+
+    def is_outlier(self, stat, amount):
+        """Check ``amount`` against the stats collected before it."""
+        if stat.count < self.min_samples or not stat.std:
+            return False
+        return (amount - stat.mean) / stat.std > self.threshold
+
+    def _locked_stat(self, category_id):
+        stat, _ = CategoryStat.objects.select_for_update().get_or_create(
+            user=self.user, category_id=category_id
+        )
+        return stat
+
+    def flag(self, expense, previous=None):
+        """
+        Set ``expense.is_anomaly`` from the current stats without writing them,
+        so the flag can go out with the expense's own INSERT/UPDATE.
+
+        :param previous: (category_id, base_amount) of the row before an edit
+        """
+        stat = (
+            CategoryStat.objects.filter(user=self.user, category_id=expense.category_id).first()
+            or CategoryStat(user=self.user, category_id=expense.category_id)
+        )
+        if previous is not None and previous[0] == expense.category_id:
+            stat.pop(previous[1])
+        expense.is_anomaly = self.is_outlier(stat, expense.base_amount)
+        return expense.is_anomaly
+
+    def record(self, expense, previous=None):
+        """
+        Fold a saved ``expense`` into the running stats; ``flag`` decided its
+        ``is_anomaly`` before the write.
+
+        :param expense: saved Expense instance with ``base_amount`` set
+        :param previous: (category_id, base_amount) of the row before an edit
+        """
+        with transaction.atomic():
+            if previous is not None:
+                self.discard(*previous)
+            stat = self._locked_stat(expense.category_id)
+            stat.push(expense.base_amount)
+            stat.save(update_fields=['count', 'mean', 'm2'])
+
+    @classmethod
+    def record_many(cls, expenses, threshold=THRESHOLD, min_samples=MIN_SAMPLES):
+        """
+        Set-based variant of ``record`` for bulk writes.
+
+        Flags each unsaved expense in date order and updates the touched
+        CategoryStat rows with one read and one upsert.
+        """
+        detector = cls(None, threshold, min_samples)
+        expenses = sorted(expenses, key=lambda e: e.date)
+        keys = {(e.user_id, e.category_id) for e in expenses}
+        if not keys:
+            return
+        with transaction.atomic():
+            user_ids = {user_id for user_id, _ in keys}
+            stats = {
+                (s.user_id, s.category_id): s
+                for s in CategoryStat.objects.select_for_update().filter(user_id__in=user_ids)
+                if (s.user_id, s.category_id) in keys
+            }
+            for expense in expenses:
+                key = (expense.user_id, expense.category_id)
+                stat = stats.get(key)
+                if stat is None:
+                    stat = stats[key] = CategoryStat(user_id=expense.user_id, category_id=expense.category_id)
+                expense.is_anomaly = detector.is_outlier(stat, expense.base_amount)
+                stat.push(expense.base_amount)
+            cls._save_stats(stats.values())
+
+    @classmethod
+    def discard_many(cls, rows):
+        """
+        Set-based variant of ``discard``.
+
+        :param rows: iterable of (user_id, category_id, base_amount) previously recorded
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        with transaction.atomic():
+            keys = {(user_id, category_id) for user_id, category_id, _ in rows}
+            stats = {
+                (s.user_id, s.category_id): s
+                for s in CategoryStat.objects.select_for_update().filter(user_id__in={k[0] for k in keys})
+                if (s.user_id, s.category_id) in keys
+            }
+            for user_id, category_id, amount in rows:
+                stat = stats.get((user_id, category_id))
+                if stat is not None:
+                    stat.pop(amount)
+            cls._save_stats(stats.values())
+
+    @classmethod
+    def fold_category(cls, category_id):
+        """
+        Merge a category's stats into each owner's uncategorised stats, which
+        is where its expenses end up when the category is deleted.
+        """
+        with transaction.atomic():
+            folded = list(CategoryStat.objects.select_for_update().filter(category_id=category_id))
+            if not folded:
+                return
+            targets = {
+                s.user_id: s for s in CategoryStat.objects.select_for_update()
+                                                   .filter(category=None, user_id__in={s.user_id for s in folded})
+            }
+            for stat in folded:
+                target = targets.get(stat.user_id)
+                if target is None:
+                    target = targets[stat.user_id] = CategoryStat(user_id=stat.user_id, category_id=None)
+                target.merge(stat)
+            cls._save_stats(targets.values())
+
+    @staticmethod
+    def _save_stats(stats):
+        # One upsert instead of bulk_update, whose CASE statements take seconds for
+        # a few thousand rows on SQLite. It conflicts on the id: uncategorised stats
+        # hold NULL in (user, category), and NULLs never conflict.
+        CategoryStat.objects.bulk_create(
+            stats, batch_size=500,
+            update_conflicts=True, unique_fields=['id'], update_fields=['count', 'mean', 'm2'],
+        )
+
+    def discard(self, category_id, amount):
+        """Remove a previously recorded amount (edit or delete)."""
+        with transaction.atomic():
+            stat = self._locked_stat(category_id)
+            stat.pop(amount)
+            stat.save(update_fields=['count', 'mean', 'm2'])
+
+    @classmethod
+    def rebuild(cls, threshold=THRESHOLD, min_samples=MIN_SAMPLES, batch_size=2000, user=None, user_ids=None):
+        """
+        Recompute every CategoryStat and anomaly flag from history in one pass.
+
+        Rows are streamed in (user, category, date) order so each expense is
+        judged only against the expenses recorded before it, exactly as it
+        would have been at save time.
+
+        :param user: only rebuild this user's stats, e.g. after a base currency change
+        :param user_ids: only rebuild these users (ids or a values('id') queryset), e.g. after a rate import
+        """
+        owned = {'user': user} if user is not None else {}
+        if user_ids is not None:
+            owned['user_id__in'] = user_ids
+        detector = cls(None, threshold, min_samples)
+        stats = {}
+        anomaly_ids = []
+        rows = (
+            in_base_currency(Expense.objects.filter(**owned))
+            .order_by('user_id', 'category_id', 'date', 'id')
+            .values_list('id', 'user_id', 'category_id', 'base_amount')
+            .iterator(chunk_size=batch_size)
+        )
+        for expense_id, user_id, category_id, amount in rows:
+            key = (user_id, category_id)
+            stat = stats.get(key)
+            if stat is None:
+                stat = stats[key] = CategoryStat(user_id=user_id, category_id=category_id)
+            if detector.is_outlier(stat, amount):
+                anomaly_ids.append(expense_id)
+            stat.push(amount)
+
+        with transaction.atomic():
+            CategoryStat.objects.filter(**owned).delete()
+            CategoryStat.objects.bulk_create(stats.values(), batch_size=batch_size)
+            Expense.objects.filter(is_anomaly=True, **owned).update(is_anomaly=False)
+            for start in range(0, len(anomaly_ids), batch_size):
+                Expense.objects.filter(id__in=anomaly_ids[start:start + batch_size]).update(is_anomaly=True)
+
+        return len(stats), len(anomaly_ids)
+
+
+# Expense.category is SET_NULL but stats cascade; runs before the cascade deletes the category's stats
+@receiver(pre_delete, sender=Category)
+def _fold_deleted_category(sender, instance, **kwargs):
+    AnomalyDetector.fold_category(instance.pk)
@@ -1,6 +1,6 @@
 from django.db.models import Sum
-from datetime import datetime
 from collections import defaultdict
+from core_app.category_cache import categories
 import calendar
 
 class BudgetBalancer:
@@ -8,20 +8,64 @@ class BudgetBalancer:
     Enhanced algorithm for detailed budget analysis.
     """
 
-    def __init__(self, incomes, expenses):
+    def __init__(self, incomes, expenses, amount_field='amount', currency_symbol='₹'):
         """
         :param incomes: list or queryset of Income objects
         :param expenses: list or queryset of Expense objects
+        :param amount_field: attribute holding the amount to total, e.g. 'base_amount'
+            when the querysets were converted to the user's currency in SQL
+        :param currency_symbol: symbol used in status and insight messages
         """
+        self.amount_field = amount_field
+        self.currency_symbol = currency_symbol
         self.incomes = list(incomes)
         self.expenses = list(expenses)
+        self._rows = None
+
+    @classmethod
+    def from_rows(cls, income_rows, expense_rows, currency_symbol='₹'):
+        """
+        Streaming mode: analyse plain tuples without building model instances.
+
+        Memory stays proportional to the number of categories and months, not
+        to the history, so rows can come straight from
+        ``values_list(...).iterator()``. The iterables are consumed once, so
+        call ``analyze()`` only once on a streaming balancer.
+
+        :param income_rows: iterable of (amount, date)
+        :param expense_rows: iterable of (amount, date, category_id)
+        """
+        balancer = cls((), (), currency_symbol=currency_symbol)
+        balancer._rows = (income_rows, expense_rows)
+        return balancer
+
+    def rows(self):
+        """(income_rows, expense_rows) in the tuple shapes ``from_rows`` takes."""
+        if self._rows is not None:
+            return self._rows
+        amount = self.amount_field
+        return (
+            ((getattr(inc, amount), inc.date) for inc in self.incomes),
+            ((getattr(exp, amount), exp.date, exp.category_id) for exp in self.expenses),
+        )
 
     def analyze(self):
         """Return a detailed summary including totals, category distribution, and monthly trends"""
+        # ---------------- SINGLE PASS ----------------
+        # Every accumulator is updated while the rows stream past
+        income_rows, expense_rows = self.rows()
+        total_income = total_expense = 0
+        category_totals = defaultdict(float)
+        monthly_data = defaultdict(lambda: {'income': 0, 'expense': 0})
+        for amt, day in income_rows:
+            total_income += amt
+            monthly_data[(day.year, day.month)]['income'] += amt
+        for amt, day, category_id in expense_rows:
+            total_expense += amt
+            category_totals[category_id] += amt
+            monthly_data[(day.year, day.month)]['expense'] += amt
+
         # ---------------- TOTALS ----------------
-        # FIX: sum by amount field instead of objects
-        total_income = sum(inc.amount for inc in self.incomes)
-        total_expense = sum(exp.amount for exp in self.expenses)
         balance = total_income - total_expense
         savings_ratio = round((balance / total_income) * 100, 2) if total_income else 0
 
@@ -30,16 +74,16 @@ class BudgetBalancer:
         elif balance == 0:
             status = "🟡 Breaking even — No savings this month."
         else:
-            status = f"🔴 Overspent — You are over budget by ₹{abs(balance)}."
+            status = f"🔴 Overspent — You are over budget by {self.currency_symbol}{abs(balance)}."
 
         # ---------------- EXPENSE DISTRIBUTION ----------------
-        category_totals = defaultdict(float)
-        for exp in self.expenses:
-            cat_name = getattr(exp.category, 'name', 'Uncategorized')
-            category_totals[cat_name] += exp.amount
+        # Names come from the category cache once per category, not once per row
+        named_totals = defaultdict(float)
+        for category_id, amt in category_totals.items():
+            named_totals[categories.name(category_id)] += amt
 
         category_distribution = []
-        for cat, amt in category_totals.items():
+        for cat, amt in named_totals.items():
             perc = round((amt / total_expense) * 100, 2) if total_expense else 0
             category_distribution.append({
                 'category': cat,
@@ -51,22 +95,13 @@ class BudgetBalancer:
         category_distribution.sort(key=lambda x: x['amount'], reverse=True)
 
         # ---------------- MONTHLY TREND ----------------
-        monthly_data = defaultdict(lambda: {'income': 0, 'expense': 0})
-        for inc in self.incomes:
-            month_key = inc.date.strftime('%b %Y')
-            monthly_data[month_key]['income'] += inc.amount
-
-        for exp in self.expenses:
-            month_key = exp.date.strftime('%b %Y')
-            monthly_data[month_key]['expense'] += exp.amount
-
         monthly_trend = []
-        for month, data in sorted(monthly_data.items(), key=lambda x: datetime.strptime(x[0], '%b %Y')):
+        for (year, month), data in sorted(monthly_data.items()):
             month_income = data['income']
             month_expense = data['expense']
             month_balance = month_income - month_expense
             monthly_trend.append({
-                'month': month,
+                'month': f"{calendar.month_abbr[month]} {year}",
                 'income': month_income,
                 'expense': month_expense,
                 'balance': month_balance
@@ -79,7 +114,7 @@ class BudgetBalancer:
         for month_data in monthly_trend:
             if month_data['balance'] < 0:
                 insights.append(
-                    f"You overspent in {month_data['month']} by ₹{abs(month_data['balance'])} — check big expenses."
+                    f"You overspent in {month_data['month']} by {self.currency_symbol}{abs(month_data['balance'])} — check big expenses."
                 )
 
         # Check top spending category
@@ -0,0 +1,199 @@
+from collections import defaultdict
+from functools import cached_property
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from core_app.currency import base_currency, currency_symbol, in_base_currency
+from core_app.models import ArchivedSummary, Category, CategoryBudget, CategorySpend, Expense
+
+
+class BudgetTracker:
+    """
+    Keeps CategorySpend counters in step with expense writes so that checking
+    a CategoryBudget limit is two indexed lookups instead of a re-aggregation.
+    Counters and limits are in the user's base currency (``base_amount``).
+    """
+
+    WARNING_RATIO = 0.8
+
+    def __init__(self, user):
+        """
+        :param user: owner of the expenses being tracked
+        """
+        self.user = user
+
+    @staticmethod
+    def month_of(day):
+        return day.replace(day=1)
+
+    def _apply(self, user_id, category_id, day, delta):
+        """Atomically add ``delta`` to one counter, creating it on first use."""
+        if not delta:
+            return
+        month = self.month_of(day)
+        counter = CategorySpend.objects.filter(user_id=user_id, category_id=category_id, month=month)
+        if not counter.update(spent=F('spent') + delta):
+            CategorySpend.objects.get_or_create(user_id=user_id, category_id=category_id, month=month)
+            counter.update(spent=F('spent') + delta)
+
+    def record(self, expense, previous=None):
+        """
+        Count ``expense`` towards its month.
+
+        :param expense: Expense instance about to be saved
+        :param previous: (category_id, base_amount, date) of the row before an edit
+        """
+        with transaction.atomic():
+            if previous is not None:
+                self.discard(*previous)
+            self._apply(expense.user_id, expense.category_id, expense.date, expense.base_amount)
+
+    def discard(self, category_id, amount, day):
+        """Remove a previously counted expense (edit or delete)."""
+        self._apply(self.user.pk, category_id, day, -amount)
+
+    @classmethod
+    def record_many(cls, expenses, sign=1):
+        """
+        Set-based variant of ``record``: sums the expenses per (user, category,
+        month), reads the touched counters in one query and writes them back
+        with one upsert.
+
+        :param sign: -1 to take the expenses back out (bulk edit or delete)
+        """
+        deltas = defaultdict(float)
+        for expense in expenses:
+            deltas[(expense.user_id, expense.category_id, cls.month_of(expense.date))] += sign * expense.base_amount
+        cls._add(deltas)
+
+    @classmethod
+    def fold_category(cls, category_id):
+        """
+        Add a category's counters to its owners' uncategorised counters, which
+        is where its expenses end up when the category is deleted.
+        """
+        deltas = defaultdict(float)
+        for user_id, month, spent in CategorySpend.objects.filter(category_id=category_id) \
+                                                          .values_list('user_id', 'month', 'spent'):
+            deltas[(user_id, None, month)] += spent
+        cls._add(deltas)
+
+    @staticmethod
+    def _add(deltas):
+        """Add {(user_id, category_id, month): amount} to the counters, creating missing ones."""
+        deltas = {key: amount for key, amount in deltas.items() if amount}
+        if not deltas:
+            return
+        with transaction.atomic():
+            counters = {
+                (c.user_id, c.category_id, c.month): c
+                for c in CategorySpend.objects.select_for_update()
+                                      .filter(user_id__in={key[0] for key in deltas},
+                                              month__in={key[2] for key in deltas})
+                if (c.user_id, c.category_id, c.month) in deltas
+            }
+            for (user_id, category_id, month), amount in deltas.items():
+                counter = counters.get((user_id, category_id, month))
+                if counter is None:
+                    counter = counters[user_id, category_id, month] = CategorySpend(
+                        user_id=user_id, category_id=category_id, month=month
+                    )
+                counter.spent += amount
+            # Conflicts on the primary key, not (user, category, month): uncategorised counters hold NULL there
+            CategorySpend.objects.bulk_create(
+                counters.values(), batch_size=500,
+                update_conflicts=True, unique_fields=['id'], update_fields=['spent'],
+            )
+
+    def check(self, category_id, day):
+        """
+        Compare this month's counter with the category limit.
+
+        :return: warning message, or None when there is no limit or it is far off
+        """
+        if category_id is None:
+            return None
+        budget = (
+            CategoryBudget.objects.filter(user=self.user, category_id=category_id)
+                                  .select_related('category').first()
+        )
+        if budget is None:
+            return None
+        spent = (
+            CategorySpend.objects.filter(user=self.user, category_id=category_id, month=self.month_of(day))
+                                 .values_list('spent', flat=True).first()
+        ) or 0
+        return self.describe(budget.category.name, spent, budget.monthly_limit, day)
+
+    def describe(self, category_name, spent, limit, day):
+        month = day.strftime('%b %Y')
+        symbol = self.symbol
+        if spent > limit:
+            return f"🔴 {category_name} is over its {month} budget: {symbol}{spent} of {symbol}{limit}."
+        if spent >= limit * self.WARNING_RATIO:
+            return (f"🟡 {category_name} has used {round(spent / limit * 100, 2)}% of its {month} budget "
+                    f"({symbol}{spent} of {symbol}{limit}).")
+        return None
+
+    @cached_property
+    def symbol(self):
+        return currency_symbol(base_currency(self.user))
+
+    def status(self, day):
+        """Every budget of the user with this month's spend, for the dashboard."""
+        month = self.month_of(day)
+        spent = dict(
+            CategorySpend.objects.filter(user=self.user, month=month)
+                                 .values_list('category_id', 'spent')
+        )
+        rows = []
+        for budget in CategoryBudget.objects.filter(user=self.user).select_related('category').order_by('category__name'):
+            amount = spent.get(budget.category_id, 0)
+            rows.append({
+                'id': budget.id,
+                'category': budget.category.name,
+                'limit': budget.monthly_limit,
+                'spent': amount,
+                'percentage': round(amount / budget.monthly_limit * 100, 2) if budget.monthly_limit else 0,
+                'warning': self.describe(budget.category.name, amount, budget.monthly_limit, day),
+            })
+        return rows
+
+    @staticmethod
+    def rebuild(batch_size=2000, user=None, user_ids=None):
+        """
+        Recompute every counter from live and archived history with grouped queries.
+
+        :param user: only rebuild this user's counters, e.g. after a base currency change
+        :param user_ids: only rebuild these users (ids or a values('id') queryset), e.g. after a rate import
+        """
+        owned = {'user': user} if user is not None else {}
+        if user_ids is not None:
+            owned['user_id__in'] = user_ids
+        totals = defaultdict(float)
+        for source in (Expense.objects.filter(**owned),
+                       ArchivedSummary.objects.filter(kind=ArchivedSummary.EXPENSE, **owned)):
+            rows = (
+                in_base_currency(source).annotate(month=TruncMonth('date'))
+                      .values('user_id', 'category_id', 'month')
+                      .annotate(total=Sum('base_amount'))
+                      .order_by()
+            )
+            for row in rows.iterator():
+                totals[(row['user_id'], row['category_id'], row['month'])] += row['total']
+        with transaction.atomic():
+            CategorySpend.objects.filter(**owned).delete()
+            CategorySpend.objects.bulk_create(
+                (CategorySpend(user_id=user_id, category_id=category_id, month=month, spent=spent)
+                 for (user_id, category_id, month), spent in totals.items()),
+                batch_size=batch_size,
+            )
+        return len(totals)
+
+
+# Expense.category is SET_NULL but counters cascade; runs before the cascade deletes the category's counters
+@receiver(pre_delete, sender=Category)
+def _fold_deleted_category(sender, instance, **kwargs):
+    BudgetTracker.fold_category(instance.pk)
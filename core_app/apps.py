@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core_app'
+
+    def ready(self):
+        # Registers the signal handlers that invalidate the category cache and, when a
+        # category is deleted, move its stats and counters to the uncategorised ones
+        from core_app import category_cache  # noqa: F401
+        from core_app.algorithms import anomaly_detector, budget_tracker  # noqa: F401
@@ -0,0 +1,215 @@
+"""
+Cold storage for old transactions.
+
+Expenses and incomes older than the archive horizon are appended to
+gzip-compressed NDJSON files under ``MEDIA_ROOT/archive/<kind>/<user_id>/<year>.ndjson.gz``
+and removed from the live tables. Their totals per bucket (see ``summary_buckets``)
+and category are kept in ``ArchivedSummary`` so reports, the dashboard and
+BudgetBalancer still see the full history; the rows themselves are read back
+lazily by ``ArchiveLoader``.
+
+Buckets follow the BS calendar in ``CalendarDay``; after extending it over
+archived dates, ``rebuild_summaries`` recomputes the totals from the files.
+"""
+import gzip
+import json
+from collections import defaultdict
+from datetime import date, timedelta
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+
+from core_app import data_version
+from core_app.category_cache import categories
+from core_app.models import ArchivedSummary, CalendarDay, Expense, Income, add_months
+
+ARCHIVE_DIR = 'archive'
+
+ARCHIVED_FIELDS = {
+    ArchivedSummary.EXPENSE: (Expense, ('id', 'user_id', 'category_id', 'amount', 'currency', 'description',
+                                        'date', 'is_anomaly', 'recurring_rule_id')),
+    ArchivedSummary.INCOME: (Income, ('id', 'user_id', 'amount', 'currency', 'description', 'date',
+                                      'recurring_rule_id')),
+}
+
+
+def archive_cutoff(today=None, months=None):
+    """First day of the oldest month that stays live; whole months are archived together."""
+    today = today or date.today()
+    months = settings.ARCHIVE_AFTER_MONTHS if months is None else months
+    return add_months(today.replace(day=1), -months)
+
+
+def week_bucket(day):
+    """Start of the fixed report week (days 1–7, 8–14, 15–21, 22–end) containing ``day``."""
+    return day.replace(day=min((day.day - 1) // 7 * 7 + 1, 22))
+
+
+def summary_buckets(days):
+    """
+    {day: date its archived totals are stored under} for ``days``.
+
+    The bucket is the start of the day's fixed report week, moved forward to
+    the first day of its BS month when that month begins mid-week. A bucket
+    therefore never spans two AD weeks or months, nor two BS months or fiscal
+    years, and both calendars report archived totals where the rows were.
+    Days missing from CalendarDay use the week start alone.
+    """
+    days = set(days)
+    if not days:
+        return {}
+    # A BS month has at most 32 days, so this range holds the start of every month involved
+    calendar = CalendarDay.objects.filter(
+        date__range=(min(days) - timedelta(days=32), max(days))
+    ).order_by('date').values_list('date', 'bs_year', 'bs_month')
+    month_starts, month_of = {}, {}
+    for day, bs_year, bs_month in calendar:
+        month_starts.setdefault((bs_year, bs_month), day)
+        month_of[day] = (bs_year, bs_month)
+
+    buckets = {}
+    for day in days:
+        bucket = week_bucket(day)
+        if day in month_of:
+            bucket = max(bucket, month_starts[month_of[day]])
+        buckets[day] = bucket
+    return buckets
+
+
+def archive_path(kind, user_id, year):
+    return Path(settings.MEDIA_ROOT) / ARCHIVE_DIR / kind / str(user_id) / f"{year}.ndjson.gz"
+
+
+def archive_transactions(cutoff, batch_size=5000):
+    """
+    Move every transaction dated before ``cutoff`` to cold storage.
+
+    :return: {kind: number of rows archived}
+    """
+    archived = {}
+    for kind, (model, fields) in ARCHIVED_FIELDS.items():
+        archived[kind] = 0
+        old_rows = model.objects.filter(date__lt=cutoff).order_by('id').values(*fields)
+        while True:
+            rows = list(old_rows[:batch_size])
+            if not rows:
+                break
+            with transaction.atomic():
+                _add_to_summaries(kind, rows)
+                _write_files(kind, rows)
+                model.objects.filter(id__in=[row['id'] for row in rows]).delete()
+                data_version.bump(*(row['user_id'] for row in rows), kinds=[kind])
+            archived[kind] += len(rows)
+    return archived
+
+
+def _write_files(kind, rows):
+    by_file = defaultdict(list)
+    for row in rows:
+        by_file[(row['user_id'], row['date'].year)].append(row)
+    for (user_id, year), file_rows in by_file.items():
+        path = archive_path(kind, user_id, year)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Appending writes a new gzip member; readers see one continuous stream
+        with gzip.open(path, 'at', encoding='utf-8') as fh:
+            for row in file_rows:
+                fh.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+
+
+def rebuild_summaries(batch_size=5000):
+    """
+    Recompute every ArchivedSummary from the archive files, so totals
+    archived before CalendarDay covered their dates move to their BS buckets.
+
+    :return: {kind: number of archived rows summarised}
+    """
+    summarised = {}
+    for kind in ARCHIVED_FIELDS:
+        summarised[kind] = 0
+        directory = Path(settings.MEDIA_ROOT) / ARCHIVE_DIR / kind
+        user_ids = [int(path.name) for path in directory.iterdir()] if directory.exists() else []
+        # Files of deleted users have no summaries to rebuild
+        for user_id in User.objects.filter(id__in=user_ids).order_by('id').values_list('id', flat=True):
+            rows = iter(ArchiveLoader(User(pk=user_id), kind))
+            with transaction.atomic():
+                ArchivedSummary.objects.filter(user_id=user_id, kind=kind).delete()
+                while batch := list(islice(rows, batch_size)):
+                    for row in batch:
+                        # A deleted category's totals stay, uncategorised, as SET_NULL left them
+                        if row.get('category_id') is not None and categories.get(row['category_id']) is None:
+                            row['category_id'] = None
+                    _add_to_summaries(kind, batch)
+                    summarised[kind] += len(batch)
+    data_version.bump_all()
+    return summarised
+
+
+def _add_to_summaries(kind, rows):
+    totals = defaultdict(lambda: [0.0, 0])
+    buckets = summary_buckets(row['date'] for row in rows)
+    for row in rows:
+        # Kept per currency so converted totals use the bucket's rate, not a blended one
+        key = (row['user_id'], row.get('category_id'), row['currency'], buckets[row['date']])
+        totals[key][0] += row['amount']
+        totals[key][1] += 1
+
+    for (user_id, category_id, currency, bucket), (amount, count) in totals.items():
+        # Deleting a category leaves its rows uncategorised next to the existing NULL row of the
+        # bucket (NULLs never trip unique_archived_summary), so add to exactly one of them
+        summary_id = (
+            ArchivedSummary.objects.filter(user_id=user_id, kind=kind, category_id=category_id,
+                                           currency=currency, date=bucket)
+                                   .order_by('id').values_list('id', flat=True).first()
+        )
+        if summary_id is not None:
+            ArchivedSummary.objects.filter(pk=summary_id).update(amount=F('amount') + amount,
+                                                                 count=F('count') + count)
+        else:
+            ArchivedSummary.objects.create(user_id=user_id, kind=kind, category_id=category_id,
+                                           currency=currency, date=bucket, amount=amount, count=count)
+
+
+class ArchiveLoader:
+    """
+    Lazy, read-only access to one user's archived rows.
+    Nothing is read from disk until the rows are iterated.
+    """
+
+    def __init__(self, user, kind=ArchivedSummary.EXPENSE):
+        """
+        :param user: owner of the archived rows
+        :param kind: 'expense' or 'income'
+        """
+        self.user = user
+        self.kind = kind
+
+    def years(self):
+        directory = archive_path(self.kind, self.user.pk, 0).parent
+        if not directory.exists():
+            return []
+        return sorted(int(path.name.split('.')[0]) for path in directory.glob('*.ndjson.gz'))
+
+    def rows(self, year=None):
+        """Yield archived rows as dicts, oldest year first."""
+        for file_year in ([year] if year is not None else self.years()):
+            path = archive_path(self.kind, self.user.pk, file_year)
+            if not path.exists():
+                continue
+            seen = set()
+            with gzip.open(path, 'rt', encoding='utf-8') as fh:
+                for line in fh:
+                    row = json.loads(line)
+                    # A retried batch may have been appended twice
+                    if row['id'] in seen:
+                        continue
+                    seen.add(row['id'])
+                    row['date'] = date.fromisoformat(row['date'])
+                    yield row
+
+    def __iter__(self):
+        return self.rows()
@@ -0,0 +1,72 @@
+"""
+Bikram Sambat (Nepali) calendar helpers.
+
+Reports never convert dates row by row: ``build_calendar`` fills the
+``CalendarDay`` dimension once and queries group on its columns through the
+``calendar`` relation on Expense and Income.
+"""
+from datetime import date, timedelta
+
+BS_MONTHS = [
+    'Baisakh', 'Jestha', 'Asar', 'Shrawan', 'Bhadra', 'Asoj',
+    'Kartik', 'Mangsir', 'Poush', 'Magh', 'Falgun', 'Chaitra',
+]
+
+# The Nepali fiscal year runs from Shrawan 1 to the end of Asar
+FISCAL_YEAR_START_MONTH = 4
+
+DEFAULT_START = date(2000, 1, 1)
+DEFAULT_END = date(2040, 12, 31)
+
+
+def fiscal_year_of(bs_year, bs_month):
+    return bs_year if bs_month >= FISCAL_YEAR_START_MONTH else bs_year - 1
+
+
+def bs_month_label(bs_year, bs_month):
+    if bs_year is None:
+        return 'Unmapped'
+    return f"{BS_MONTHS[bs_month - 1]} {bs_year}"
+
+
+def fiscal_year_label(fiscal_year):
+    if fiscal_year is None:
+        return 'Unmapped'
+    return f"FY {fiscal_year}/{(fiscal_year + 1) % 100:02d}"
+
+
+def build_calendar(start=DEFAULT_START, end=DEFAULT_END, batch_size=2000):
+    """
+    Insert CalendarDay rows for every Gregorian date in [start, end].
+    Existing rows are left untouched, so the command can be re-run to extend the range.
+
+    :return: number of rows created
+    """
+    import nepali_datetime
+    from core_app import data_version
+    from core_app.models import CalendarDay
+
+    existing = set(
+        CalendarDay.objects.filter(date__range=(start, end)).values_list('date', flat=True)
+    )
+    one_day = timedelta(days=1)
+    bs_day = nepali_datetime.date.from_datetime_date(start)
+    current = start
+    rows = []
+    while current <= end:
+        if current not in existing:
+            rows.append(CalendarDay(
+                date=current,
+                bs_year=bs_day.year,
+                bs_month=bs_day.month,
+                bs_day=bs_day.day,
+                fiscal_year=fiscal_year_of(bs_day.year, bs_day.month),
+            ))
+        current += one_day
+        bs_day += one_day
+
+    CalendarDay.objects.bulk_create(rows, batch_size=batch_size)
+    if rows:
+        # Every BS report and chart may regroup, including fragments that showed "Unmapped"
+        data_version.bump_all()
+    return len(rows)
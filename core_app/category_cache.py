@@ -0,0 +1,97 @@
+"""
+Process-local cache of Category and IncomeCategory rows.
+
+Categories almost never change, so each worker keeps them in memory keyed by
+id. Every save or delete bumps a version stamp in the shared Django cache;
+a worker reloads its copy the next time it sees a stamp different from the one
+it loaded. The stamp only reaches every worker through a CACHES backend shared
+between processes, like the file cache configured in settings.
+
+Queryset ``update()``/``delete()`` bypass the signals; call ``invalidate()``
+after using them on categories.
+"""
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core_app import data_version
+from core_app.models import Category, IncomeCategory
+from core_app.replica import PRIMARY
+
+UNCATEGORIZED = 'Uncategorized'
+
+
+class CategoryCache:
+    def __init__(self, model):
+        """
+        :param model: Category or IncomeCategory
+        """
+        self.model = model
+        self.version_key = f'core_app:{model._meta.model_name}:version'
+        self._lock = threading.Lock()
+        self._version = None
+        self._rows = {}
+
+    def _shared_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            # First worker to look (or the first after an eviction) publishes a stamp;
+            # add() keeps one published concurrently
+            cache.add(self.version_key, uuid.uuid4().hex, timeout=None)
+            version = cache.get(self.version_key)
+        return version
+
+    def _current(self):
+        version = self._shared_version()
+        # No stamp means no usable shared cache (e.g. DummyCache): always reload
+        if version is None or version != self._version:
+            with self._lock:
+                if version is None or version != self._version:
+                    # Always the primary: a lagging replica would cache old rows under the new stamp
+                    rows = self.model.objects.using(PRIMARY).order_by('name', 'pk')
+                    self._rows = {row.pk: row for row in rows}
+                    self._version = version
+        return self._rows
+
+    def all(self):
+        """Every row, ordered by name. Treat the instances as read-only."""
+        return list(self._current().values())
+
+    def get(self, pk):
+        """The row with ``pk`` or None."""
+        return self._current().get(pk)
+
+    def name(self, pk, default=UNCATEGORIZED):
+        row = self._current().get(pk)
+        return row.name if row is not None else default
+
+    def names(self):
+        """{id: name} for every row."""
+        return {pk: row.name for pk, row in self._current().items()}
+
+    def invalidate(self):
+        """Make every worker reload on its next lookup."""
+        # A fresh random stamp, so a stamp that was evicted and republished never matches an old copy
+        cache.set(self.version_key, uuid.uuid4().hex, timeout=None)
+        self._version = None
+
+
+categories = CategoryCache(Category)
+income_categories = CategoryCache(IncomeCategory)
+
+
+# Invalidated after commit, so no worker can reload the old rows in between.
+# Expense category names appear in everyone's cached reports, hence the global bump.
+@receiver([post_save, post_delete], sender=Category)
+def _category_changed(sender, **kwargs):
+    transaction.on_commit(categories.invalidate)
+    data_version.bump_all()
+
+
+@receiver([post_save, post_delete], sender=IncomeCategory)
+def _income_category_changed(sender, **kwargs):
+    transaction.on_commit(income_categories.invalidate)
@@ -0,0 +1,7 @@
+from core_app.currency import base_currency, currency_symbol
+
+
+def currency(request):
+    """Expose the user's base currency and its symbol to every template."""
+    code = base_currency(getattr(request, 'user', None))
+    return {'base_currency': code, 'currency_symbol': currency_symbol(code)}
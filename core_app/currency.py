@@ -0,0 +1,173 @@
+"""
+Multi-currency support.
+
+Every ExchangeRate row gives the value of one unit of a currency in
+DEFAULT_CURRENCY on a date; a transaction uses the latest rate published on or
+before its own date. Aggregations convert inside SQL through the
+``base_amount`` expression, and write paths that need converted values for a
+handful of unsaved rows use ``attach_base_amounts``, which loads the rates for
+the whole batch at once.
+"""
+import csv
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Case, Exists, F, FloatField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from core_app import data_version
+from core_app.models import ArchivedSummary, CurrencyPreference, ExchangeRate, Expense
+
+# How far before a batch's earliest date rates are preloaded; older gaps fall back to one lookup
+RATE_WINDOW = timedelta(days=14)
+
+
+def currency_symbol(code):
+    return settings.CURRENCIES.get(code, code)
+
+
+def base_currency(user):
+    if not getattr(user, 'is_authenticated', False):
+        return settings.DEFAULT_CURRENCY
+    return (
+        CurrencyPreference.objects.filter(user=user).values_list('base_currency', flat=True).first()
+        or settings.DEFAULT_CURRENCY
+    )
+
+
+def _rate_on(currency):
+    """Expression: rate of ``currency`` (an expression) on the outer row's date."""
+    return Subquery(
+        ExchangeRate.objects.filter(currency=OuterRef(currency), date__lte=OuterRef('date'))
+                            .order_by('-date').values('rate')[:1],
+        output_field=FloatField(),
+    )
+
+
+def base_amount_expression():
+    """
+    ``amount`` converted to the owner's base currency, for Expense, Income and
+    ArchivedSummary querysets. Rows without a published rate keep their amount.
+    """
+    default = settings.DEFAULT_CURRENCY
+    base = 'user__currency_preference__base_currency'
+    own_rate = Case(
+        When(currency=default, then=Value(1.0)),
+        default=Coalesce(_rate_on('currency'), Value(1.0)),
+        output_field=FloatField(),
+    )
+    base_rate = Case(
+        When(Q(**{f'{base}__isnull': True}) | Q(**{base: default}), then=Value(1.0)),
+        default=Coalesce(_rate_on(base), Value(1.0)),
+        output_field=FloatField(),
+    )
+    return Case(
+        When(currency=Coalesce(F(base), Value(default)), then=F('amount')),
+        default=F('amount') * own_rate / base_rate,
+        output_field=FloatField(),
+    )
+
+
+def in_base_currency(queryset):
+    """Annotate ``base_amount`` so callers can read it or Sum('base_amount')."""
+    return queryset.annotate(base_amount=base_amount_expression())
+
+
+class RateTable:
+    """Rates for a batch of (currency, date) lookups, loaded with one query."""
+
+    def __init__(self, currencies, start, end):
+        self.rates = defaultdict(list)  # currency -> sorted [(date, rate)]
+        currencies = set(currencies) - {settings.DEFAULT_CURRENCY}
+        rows = (
+            ExchangeRate.objects.filter(currency__in=currencies, date__range=(start - RATE_WINDOW, end))
+                                .order_by('currency', 'date').values_list('currency', 'date', 'rate')
+        )
+        for currency, day, rate in rows:
+            self.rates[currency].append((day, rate))
+
+    def rate(self, currency, day):
+        if currency == settings.DEFAULT_CURRENCY:
+            return 1.0
+        series = self.rates[currency]
+        position = bisect_right(series, (day, float('inf')))
+        if position:
+            return series[position - 1][1]
+        older = (
+            ExchangeRate.objects.filter(currency=currency, date__lte=day)
+                                .order_by('-date').values_list('rate', flat=True).first()
+        )
+        return older or 1.0
+
+
+def attach_base_amounts(transactions):
+    """
+    Set ``base_amount`` on unsaved or in-memory transactions in one batch.
+    Base currencies for all owners are read with a single query.
+    """
+    transactions = list(transactions)
+    if not transactions:
+        return transactions
+    bases = dict(
+        CurrencyPreference.objects.filter(user_id__in={t.user_id for t in transactions})
+                                  .values_list('user_id', 'base_currency')
+    )
+    currencies = {t.currency for t in transactions} | set(bases.values())
+    table = RateTable(currencies, min(t.date for t in transactions), max(t.date for t in transactions))
+    for t in transactions:
+        base = bases.get(t.user_id, settings.DEFAULT_CURRENCY)
+        if t.currency == base:
+            t.base_amount = t.amount
+        else:
+            t.base_amount = t.amount * table.rate(t.currency, t.date) / table.rate(base, t.date)
+    return transactions
+
+
+def load_rates(path, batch_size=2000):
+    """
+    Import rates from a CSV file with ``date,currency,rate`` columns.
+    Existing (currency, date) rows are overwritten, and the base-currency
+    stats and budget counters of users whose conversions may have moved are
+    rebuilt, as a base currency change does.
+
+    :return: number of rows read
+    """
+    with open(path, newline='', encoding='utf-8') as fh:
+        rows = [
+            ExchangeRate(date=date.fromisoformat(row['date']), currency=row['currency'].upper(),
+                         rate=float(row['rate']))
+            for row in csv.DictReader(fh)
+        ]
+    ExchangeRate.objects.bulk_create(
+        rows, batch_size=batch_size,
+        update_conflicts=True, unique_fields=['currency', 'date'], update_fields=['rate'],
+    )
+    if rows:
+        rebuild_converted_counters({row.currency for row in rows}, min(row.date for row in rows))
+    # Converted totals of every user may have moved
+    data_version.bump_all()
+    return len(rows)
+
+
+def rebuild_converted_counters(currencies, since):
+    """
+    Rebuild CategoryStat and CategorySpend for users holding expenses in
+    ``currencies`` dated from ``since``, or with one of them as base currency.
+    Without this, later edits and deletes would take out amounts converted at
+    the new rates from totals built at the old ones.
+    """
+    # The algorithms convert through this module
+    from core_app.algorithms.anomaly_detector import AnomalyDetector
+    from core_app.algorithms.budget_tracker import BudgetTracker
+
+    in_currencies = {'currency__in': currencies, 'date__gte': since}
+    affected = User.objects.filter(
+        Exists(Expense.objects.filter(user=OuterRef('pk'), **in_currencies))
+        | Exists(ArchivedSummary.objects.filter(user=OuterRef('pk'), kind=ArchivedSummary.EXPENSE, **in_currencies))
+        | Q(currency_preference__base_currency__in=currencies)
+    ).values('id')
+    AnomalyDetector.rebuild(user_ids=affected)
+    BudgetTracker.rebuild(user_ids=affected)
@@ -0,0 +1,54 @@
+"""
+Per-user data version stamps.
+
+Every write that changes what a user's dashboard or reports show replaces
+the user's stamp for the kind of data it touched (``expense`` or ``income``)
+in the Django cache; changes that affect everyone (exchange rates, archiving,
+categories, the BS calendar) replace a global stamp. ``current(user_id, kinds)`` combines the
+global stamp with the user's stamps for ``kinds``, so anything derived from a
+user's data (ETags, cached fragments) can be keyed on it and goes stale
+exactly when the data it reads does. The stamps must reach every worker, so
+settings.CACHES has to be shared between processes (a file cache by default).
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+GLOBAL_KEY = 'core_app:data_version'
+KINDS = ('expense', 'income')
+
+
+def _user_key(user_id, kind):
+    return f'{GLOBAL_KEY}:{user_id}:{kind}'
+
+
+def _new_stamp():
+    return uuid.uuid4().hex[:12]
+
+
+def _stamps(keys):
+    values = cache.get_many(keys)
+    for key in keys:
+        if values.get(key) is None:
+            # add() keeps a stamp another worker published at the same moment
+            cache.add(key, _new_stamp(), timeout=None)
+            values[key] = cache.get(key) or _new_stamp()
+    return [values[key] for key in keys]
+
+
+def current(user_id, kinds=KINDS):
+    """Stamp that changes whenever ``user_id``'s data of ``kinds``, or shared data, changes."""
+    return '.'.join(_stamps([GLOBAL_KEY] + [_user_key(user_id, kind) for kind in kinds]))
+
+
+def bump(*user_ids, kinds=KINDS):
+    """Mark the users' data of ``kinds`` as changed once the current transaction commits."""
+    keys = [_user_key(user_id, kind) for user_id in set(user_ids) for kind in kinds]
+    if keys:
+        transaction.on_commit(lambda: cache.set_many({key: _new_stamp() for key in keys}, timeout=None))
+
+
+def bump_all():
+    """Mark every user's data as changed once the current transaction commits."""
+    transaction.on_commit(lambda: cache.set(GLOBAL_KEY, _new_stamp(), timeout=None))
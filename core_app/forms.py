@@ -1,10 +1,56 @@
 from django import forms
-from .models import Expense, Income
+from django.forms.models import ModelChoiceIterator
+from .category_cache import categories, income_categories
+from .models import Category, CategoryBudget, CurrencyPreference, Expense, Income, RecurringRule
+
+
+class CachedCategoryChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for row in self.field.cache.all():
+            yield self.choice(row)
+
+    def __len__(self):
+        return len(self.field.cache.all()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.cache.all())
+
+
+class CachedCategoryField(forms.ModelChoiceField):
+    """
+    ModelChoiceField that renders its options and resolves submitted ids from
+    the in-process category cache instead of querying the table each time.
+    The model's own foreign key check still confirms the row exists on save.
+    """
+    iterator = CachedCategoryChoiceIterator
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = categories if self.queryset.model is Category else income_categories
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.queryset.model):
+            value = value.pk
+        try:
+            row = self.cache.get(int(value))
+        except (TypeError, ValueError):
+            row = None
+        if row is None:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value},
+            )
+        return row
+
 
 class ExpenseForm(forms.ModelForm):
     class Meta:
         model = Expense
-        fields = ['category', 'amount', 'description', 'date']
+        fields = ['category', 'amount', 'currency', 'description', 'date']
+        field_classes = {'category': CachedCategoryField}
         widgets = {
             'date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'description': forms.Textarea(attrs={'rows': 2, 'class': 'form-control'}),
@@ -14,8 +60,48 @@ class ExpenseForm(forms.ModelForm):
 class IncomeForm(forms.ModelForm):
     class Meta:
         model = Income
-        fields = ['amount', 'description', 'date']  
+        fields = ['amount', 'currency', 'description', 'date']  
         widgets = {
             'date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'description': forms.Textarea(attrs={'rows': 2, 'class': 'form-control'}),
         }
+
+
+class RecurringRuleForm(forms.ModelForm):
+    class Meta:
+        model = RecurringRule
+        fields = ['kind', 'category', 'amount', 'currency', 'description', 'frequency', 'interval', 'start_date', 'end_date']
+        field_classes = {'category': CachedCategoryField}
+        widgets = {
+            'start_date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+            'end_date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+            'description': forms.Textarea(attrs={'rows': 2, 'class': 'form-control'}),
+        }
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start_date'), cleaned_data.get('end_date')
+        if start and end and end < start:
+            self.add_error('end_date', 'End date must be on or after the start date.')
+        if cleaned_data.get('kind') == RecurringRule.INCOME:
+            cleaned_data['category'] = None
+        return cleaned_data
+
+
+class CategoryBudgetForm(forms.ModelForm):
+    class Meta:
+        model = CategoryBudget
+        fields = ['category', 'monthly_limit']
+        field_classes = {'category': CachedCategoryField}
+
+    def clean_monthly_limit(self):
+        limit = self.cleaned_data['monthly_limit']
+        if limit <= 0:
+            raise forms.ValidationError('Monthly limit must be greater than zero.')
+        return limit
+
+
+class CurrencyPreferenceForm(forms.ModelForm):
+    class Meta:
+        model = CurrencyPreference
+        fields = ['base_currency']
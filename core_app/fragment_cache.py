@@ -0,0 +1,133 @@
+"""
+Cached template fragments for the dashboard and reports.
+
+``{% fragment_cache "section" "expense,income" [vary ...] %}`` (see
+core_app.templatetags.fragments) stores the rendered HTML of one section under
+a key made of the section name, the user, the user's data version for the
+kinds of data the section reads (see core_app.data_version) and the extra vary
+values (filters, calendar mode). A write therefore only re-renders the
+sections that read what it changed: an income edit leaves the expense
+distribution cached. Views pass lazy values for the data behind these
+sections, so a hit skips the queries as well as the rendering.
+
+Fragments are rendered from whatever database the view reads; a replica that
+lags a background job (archiving, rate imports) can leave a fragment stale
+until the user's next write.
+
+Every lookup is counted twice: per request, reported in the response's
+``Server-Timing`` header by ``FragmentTimingMiddleware``, and in shared
+counters read by ``stats()`` (included in the load_test report).
+"""
+import hashlib
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core_app import data_version
+
+KEY_PREFIX = 'core_app:fragment'
+STATS_PREFIX = 'core_app:fragment_stats'
+
+# Section name -> data kinds it reads; the template tag only accepts these names
+SECTIONS = {
+    'budget_overview': ('expense', 'income'),
+    'budget_pie': ('expense', 'income'),
+    'expense_distribution': ('expense',),
+    'monthly_trend': ('expense', 'income'),
+    'insights': ('expense', 'income'),
+    'weekly_report': ('expense', 'income'),
+    'monthly_report': ('expense', 'income'),
+    'yearly_report': ('expense', 'income'),
+    'category_report': ('expense',),
+}
+
+# Set to a list by FragmentTimingMiddleware; every lookup appends (section, hit, seconds)
+_lookups = ContextVar('fragment_lookups', default=None)
+
+
+def fragment_key(section, user_id, vary=()):
+    digest = hashlib.md5(repr([str(value) for value in vary]).encode()).hexdigest()
+    version = data_version.current(user_id, SECTIONS[section])
+    return f'{KEY_PREFIX}:{section}:{user_id}:{version}:{digest}'
+
+
+def render_cached(section, user_id, vary, render):
+    """
+    Return the cached HTML of ``section`` for ``user_id``, calling ``render()``
+    and storing its result on a miss.
+    """
+    started = time.perf_counter()
+    key = fragment_key(section, user_id, vary)
+    html = cache.get(key)
+    hit = html is not None
+    if not hit:
+        html = render()
+        cache.set(key, html, settings.FRAGMENT_CACHE_SECONDS)
+    _count(section, hit, time.perf_counter() - started)
+    return html
+
+
+def _stats_key(section, outcome):
+    return f'{STATS_PREFIX}:{section}:{outcome}'
+
+
+def _count(section, hit, seconds):
+    key = _stats_key(section, 'hits' if hit else 'misses')
+    # add() then incr() keeps the counter atomic on backends that support it
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+    lookups = _lookups.get()
+    if lookups is not None:
+        lookups.append((section, hit, seconds))
+
+
+def stats():
+    """{section: {'hits', 'misses', 'hit_rate'}} counted by every worker sharing the cache."""
+    keys = {(section, outcome): _stats_key(section, outcome) for section in SECTIONS for outcome in ('hits', 'misses')}
+    values = cache.get_many(list(keys.values()))
+    result = {}
+    for section in SECTIONS:
+        hits = values.get(keys[(section, 'hits')], 0)
+        misses = values.get(keys[(section, 'misses')], 0)
+        result[section] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+    return result
+
+
+def reset_stats():
+    cache.delete_many([_stats_key(section, outcome) for section in SECTIONS for outcome in ('hits', 'misses')])
+
+
+class FragmentTimingMiddleware:
+    """
+    Report the fragment lookups of each request in a ``Server-Timing`` header,
+    e.g. ``frag-insights;desc="hit";dur=0.21``, readable in the browser's
+    network panel.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        lookups = []
+        token = _lookups.set(lookups)
+        try:
+            response = self.get_response(request)
+        finally:
+            _lookups.reset(token)
+        if lookups:
+            timings = [
+                f'frag-{section};desc="{"hit" if hit else "miss"}";dur={seconds * 1000:.2f}'
+                for section, hit, seconds in lookups
+            ]
+            existing = response.get('Server-Timing')
+            response['Server-Timing'] = ', '.join(([existing] if existing else []) + timings)
+        return response
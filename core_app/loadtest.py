@@ -0,0 +1,234 @@
+"""
+In-process load testing.
+
+``LoadTest`` logs in a set of synthetic users and replays a weighted mix of
+routes against the WSGI app through Django's test client, one thread per user,
+at a fixed overall request rate. Nothing leaves the process, so it runs offline
+against whatever database the settings point at (SQLite by default).
+"""
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+
+from core_app import data_version, fragment_cache
+from core_app.algorithms.anomaly_detector import AnomalyDetector
+from core_app.algorithms.budget_tracker import BudgetTracker
+from core_app.currency import attach_base_amounts
+from core_app.models import Category, Expense, Income
+
+USERNAME_PREFIX = 'loadtest-'
+# Only created when the database has no category to post to; removed by cleanup()
+CATEGORY_NAME = 'Load test'
+
+ROUTES = {
+    'dashboard': ('GET', 'dashboard'),
+    'reports': ('GET', 'reports'),
+    'reports_pdf': ('GET', 'reports_pdf'),
+    'add_expense': ('POST', 'add_expense'),
+}
+
+DEFAULT_MIX = {'dashboard': 5, 'reports': 2, 'reports_pdf': 1, 'add_expense': 2}
+
+
+def parse_mix(text):
+    """'dashboard=5,reports=2' -> {'dashboard': 5, 'reports': 2}"""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        name, _, weight = part.partition('=')
+        if name not in ROUTES:
+            raise ValueError(f"Unknown route '{name}'; choose from {', '.join(ROUTES)}.")
+        mix[name] = int(weight or 1)
+    if not mix or not any(mix.values()):
+        raise ValueError('The mix needs at least one route with a positive weight.')
+    return mix
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def fragment_delta(before, after):
+    """Hits and misses between two fragment_cache.stats() snapshots, for sections that were looked up."""
+    delta = {}
+    for section, counts in after.items():
+        hits = counts['hits'] - before.get(section, {}).get('hits', 0)
+        misses = counts['misses'] - before.get(section, {}).get('misses', 0)
+        if hits or misses:
+            delta[section] = {'hits': hits, 'misses': misses, 'hit_rate': round(hits / (hits + misses), 4)}
+    return delta
+
+
+class LoadTest:
+    def __init__(self, users=10, rate=20.0, duration=30.0, mix=None, history=200, host='localhost', seed=None):
+        """
+        :param users: number of synthetic users, each driven by its own thread and session
+        :param rate: target requests per second across all users
+        :param duration: seconds to keep issuing requests
+        :param mix: {route: weight}; see ROUTES
+        :param history: expenses and incomes seeded for each synthetic user that has none
+        :param host: Host header sent with every request (must pass ALLOWED_HOSTS)
+        :param seed: random seed, for repeatable schedules
+        """
+        self.users = users
+        self.rate = rate
+        self.duration = duration
+        self.mix = mix or DEFAULT_MIX
+        self.history = history
+        self.host = host
+        self.random = random.Random(seed)
+
+    # ---------------- SETUP ----------------
+    def prepare(self):
+        """Create (or reuse) the synthetic users and their history; expenses go to an existing category."""
+        # Categories are shared by every user, so a new one would show up in real users' forms
+        self.category = Category.objects.order_by('id').first() or Category.objects.create(name=CATEGORY_NAME)
+        accounts = []
+        for number in range(self.users):
+            user, created = User.objects.get_or_create(username=f'{USERNAME_PREFIX}{number}')
+            if created:
+                user.set_unusable_password()
+                user.save(update_fields=['password'])
+            if not Expense.objects.filter(user=user).exists():
+                self._seed_history(user)
+            accounts.append(user)
+        return accounts
+
+    def _seed_history(self, user):
+        today = date.today()
+        days = [today - timedelta(days=self.random.randrange(365)) for _ in range(self.history)]
+        expenses = [
+            Expense(user=user, category=self.category, amount=round(self.random.uniform(50, 5000), 2),
+                    description='Synthetic expense', date=day)
+            for day in days
+        ]
+        with transaction.atomic():
+            # Same bookkeeping as materialize_recurring, so stats, counters and caches match the rows
+            attach_base_amounts(expenses)
+            AnomalyDetector.record_many(expenses)
+            BudgetTracker.record_many(expenses)
+            Expense.objects.bulk_create(expenses)
+            Income.objects.bulk_create(
+                Income(user=user, amount=round(self.random.uniform(1000, 50000), 2),
+                       description='Synthetic income', date=day)
+                for day in days[:max(1, self.history // 10)]
+            )
+            data_version.bump(user.id)
+
+    @staticmethod
+    def cleanup():
+        """Delete every synthetic user and, through cascades, their data, plus the fallback category."""
+        deleted = User.objects.filter(username__startswith=USERNAME_PREFIX).delete()[0]
+        if not Expense.objects.filter(category__name=CATEGORY_NAME).exists():
+            deleted += Category.objects.filter(name=CATEGORY_NAME).delete()[0]
+        return deleted
+
+    # ---------------- RUN ----------------
+    def schedule(self):
+        """Planned (offset in seconds, route) pairs for the whole run, in order."""
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        total = int(self.rate * self.duration)
+        return [(n / self.rate, self.random.choices(names, weights)[0]) for n in range(total)]
+
+    def run(self):
+        accounts = self.prepare()
+        plan = self.schedule()
+        fragments_before = fragment_cache.stats()
+        samples = defaultdict(list)  # route -> [(latency_seconds, ok)]
+        lag = [0.0]
+        lock = threading.Lock()
+        started = time.perf_counter() + 0.1
+
+        def drive(index, user):
+            client = Client(HTTP_HOST=self.host)
+            client.force_login(user)
+            try:
+                # Requests are dealt round-robin, so each user keeps its share of the rate
+                for offset, route in plan[index::len(accounts)]:
+                    delay = started + offset - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    behind = -delay if delay < 0 else 0.0
+                    latency, ok = self._request(client, route)
+                    with lock:
+                        samples[route].append((latency, ok))
+                        lag[0] = max(lag[0], behind)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=drive, args=(i, user), daemon=True) for i, user in enumerate(accounts)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        fragments = fragment_delta(fragments_before, fragment_cache.stats())
+        return self.report(samples, elapsed, lag[0], fragments)
+
+    def _request(self, client, route):
+        method, url_name = ROUTES[route]
+        url = reverse(url_name)
+        begin = time.perf_counter()
+        try:
+            if method == 'POST':
+                response = client.post(url, {
+                    'category': self.category.id,
+                    'amount': round(self.random.uniform(50, 5000), 2),
+                    'currency': settings.DEFAULT_CURRENCY,
+                    'description': 'Load test',
+                    'date': date.today().isoformat(),
+                })
+                # A rejected form is re-rendered with a 200; only the redirect means it was saved
+                ok = response.status_code == 302
+            else:
+                response = client.get(url)
+                ok = response.status_code < 400
+        except Exception:
+            ok = False
+        return time.perf_counter() - begin, ok
+
+    # ---------------- REPORT ----------------
+    def report(self, samples, elapsed, max_lag, fragments=None):
+        routes = {}
+        completed = errors = 0
+        for route, results in sorted(samples.items()):
+            latencies = sorted(latency * 1000 for latency, _ in results)
+            failed = sum(1 for _, ok in results if not ok)
+            completed += len(results)
+            errors += failed
+            routes[route] = {
+                'requests': len(results),
+                'errors': failed,
+                'error_rate': round(failed / len(results), 4),
+                'throughput_rps': round(len(results) / elapsed, 2),
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p95_ms': round(percentile(latencies, 95), 2),
+                'p99_ms': round(percentile(latencies, 99), 2),
+                'max_ms': round(latencies[-1], 2),
+            }
+        return {
+            'users': self.users,
+            'target_rps': self.rate,
+            'duration_s': round(elapsed, 2),
+            'requests': completed,
+            'throughput_rps': round(completed / elapsed, 2) if elapsed else 0,
+            'error_rate': round(errors / completed, 4) if completed else 0,
+            # How far the slowest user fell behind its schedule; large values mean the rate was not sustained
+            'max_schedule_lag_ms': round(max_lag * 1000, 2),
+            'routes': routes,
+            # Fragment cache lookups made during the run, per dashboard/report section
+            'fragments': fragments or {},
+        }
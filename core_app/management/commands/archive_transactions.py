@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core_app.archive import archive_cutoff, archive_transactions
+
+
+class Command(BaseCommand):
+    help = "Move old expenses and incomes to compressed archive files, keeping their totals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.ARCHIVE_AFTER_MONTHS,
+                            help='keep this many recent months live')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(months=options['months'])
+        archived = archive_transactions(cutoff, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived['expense']} expenses and {archived['income']} incomes dated before {cutoff}."
+        ))
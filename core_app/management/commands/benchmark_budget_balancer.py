@@ -0,0 +1,74 @@
+import json
+import random
+import resource
+import time
+import tracemalloc
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from core_app.algorithms.budget_balancer import BudgetBalancer
+
+
+def synthetic_rows(count, categories, seed):
+    """Yield (amount, date, category_id) tuples spread over ten years, like values_list().iterator()."""
+    rng = random.Random(seed)
+    start = date(2015, 1, 1)
+    for _ in range(count):
+        yield rng.uniform(10, 5000), start + timedelta(days=rng.randrange(3650)), rng.choice(categories)
+
+
+class Command(BaseCommand):
+    help = "Measure BudgetBalancer peak memory and time for growing histories (streaming vs. object lists)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000,10000000',
+                            help='comma-separated expense row counts')
+        parser.add_argument('--mode', choices=('stream', 'list'), default='stream',
+                            help="'stream' feeds tuples to from_rows(); 'list' builds objects first, as before")
+        parser.add_argument('--categories', type=int, default=12)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be a comma-separated list of integers.')
+        categories = list(range(1, options['categories'] + 1))
+
+        results = []
+        for size in sizes:
+            incomes = ((amount, day) for amount, day, _ in synthetic_rows(size // 10, categories, options['seed']))
+            expenses = synthetic_rows(size, categories, options['seed'] + 1)
+            tracemalloc.start()
+            started = time.perf_counter()
+            if options['mode'] == 'stream':
+                balancer = BudgetBalancer.from_rows(incomes, expenses)
+            else:
+                balancer = BudgetBalancer(
+                    [_Row(amount, day) for amount, day in incomes],
+                    [_Row(amount, day, category_id) for amount, day, category_id in expenses],
+                )
+            balancer.analyze()
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results.append({
+                'rows': size,
+                'mode': options['mode'],
+                'peak_kib': round(peak / 1024, 1),
+                'seconds': round(elapsed, 2),
+                # Process high-water mark; it only grows, so a flat value across sizes means flat RSS
+                'max_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            })
+            self.stderr.write(f"{size} rows: peak {results[-1]['peak_kib']} KiB in {results[-1]['seconds']}s")
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+
+class _Row:
+    """Stand-in for a model instance in list mode."""
+    __slots__ = ('amount', 'date', 'category_id')
+
+    def __init__(self, amount, day, category_id=None):
+        self.amount = amount
+        self.date = day
+        self.category_id = category_id
@@ -0,0 +1,134 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from core_app.loadtest import ROUTES, LoadTest
+from core_app.warmup import STEPS, warm_up
+
+MODES = ('cold', 'warm')
+
+
+def median(values):
+    return round(statistics.median(values), 2) if values else None
+
+
+class Command(BaseCommand):
+    help = ("Measure the first requests of fresh worker processes with and without core_app.warmup "
+            "and report their latency as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='fresh processes per mode')
+        parser.add_argument('--routes', default='dashboard,reports,reports_pdf',
+                            help='GET routes requested in order by each process, from the load_test routes')
+        parser.add_argument('--steps', default=','.join(settings.WARM_UP_STEPS),
+                            help='warm-up steps run by the warm processes')
+        parser.add_argument('--history', type=int, default=200,
+                            help='expenses seeded for the synthetic user if it has none')
+        parser.add_argument('--host', default='localhost', help='Host header; must be allowed by ALLOWED_HOSTS')
+        parser.add_argument('--output', default=None, help='write the JSON report here instead of stdout')
+        parser.add_argument('--cleanup', action='store_true', help='delete the synthetic users afterwards')
+        # Internal: run inside a fresh process and print one JSON line of timings
+        parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+        parser.add_argument('--session', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        routes = [route.strip() for route in options['routes'].split(',') if route.strip()]
+        steps = [step.strip() for step in options['steps'].split(',') if step.strip()]
+        if not routes or any(ROUTES.get(route, ('POST',))[0] != 'GET' for route in routes):
+            raise CommandError(f"--routes must list GET routes from: "
+                               f"{', '.join(r for r, (method, _) in ROUTES.items() if method == 'GET')}.")
+        if any(step not in STEPS for step in steps):
+            raise CommandError(f"--steps must list warm-up steps from: {', '.join(STEPS)}.")
+
+        if options['child']:
+            self.stdout.write(json.dumps(self.measure(options['child'], options['session'], routes, steps,
+                                                      options['host'])))
+            return
+        if options['runs'] < 1:
+            raise CommandError('--runs must be positive.')
+
+        user = LoadTest(users=1, history=options['history']).prepare()[0]
+        client = Client(HTTP_HOST=options['host'])
+        client.force_login(user)
+        session = client.cookies[settings.SESSION_COOKIE_NAME].value
+
+        samples = {mode: [] for mode in MODES}
+        for _ in range(options['runs']):
+            for mode in MODES:  # interleaved, so drift (disk cache, CPU boost) hits both modes alike
+                samples[mode].append(self.spawn(mode, session, options))
+        report = json.dumps(self.report(samples, routes, steps), indent=2)
+        if options['cleanup']:
+            LoadTest.cleanup()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                fh.write(report + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote warm-up benchmark to {options['output']}."))
+        else:
+            self.stdout.write(report)
+
+    def spawn(self, mode, session, options):
+        # System checks would import the URLconf, and with it the views, before the first request
+        command = [
+            sys.executable, '-m', 'django', 'benchmark_warmup', '--skip-checks',
+            '--child', mode, '--session', session,
+            '--routes', options['routes'], '--steps', options['steps'], '--host', options['host'],
+        ]
+        result = subprocess.run(command, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f'The {mode} worker failed:\n{result.stderr}')
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    @staticmethod
+    def measure(mode, session, routes, steps, host):
+        """Timings of one fresh process: the warm-up (if any), then two requests per route."""
+        client = Client(HTTP_HOST=host)
+        client.cookies[settings.SESSION_COOKIE_NAME] = session
+        # get_wsgi_application() loads the middleware at boot; the test client would on its first request
+        client.handler.load_middleware()
+
+        result = {'warm_up_ms': None, 'steps_ms': {}, 'first_ms': {}, 'repeat_ms': {}}
+        if mode == 'warm':
+            started = time.perf_counter()
+            timings = warm_up(steps)
+            result['warm_up_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            result['steps_ms'] = {step: round(seconds * 1000, 2) for step, seconds in timings.items()}
+        for key in ('first_ms', 'repeat_ms'):
+            for route in routes:
+                started = time.perf_counter()
+                response = client.get(reverse(ROUTES[route][1]))
+                if response.status_code != 200:
+                    raise CommandError(f'{route} answered {response.status_code}.')
+                result[key][route] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    @staticmethod
+    def report(samples, routes, steps):
+        cold, warm = samples['cold'], samples['warm']
+        return {
+            'runs': len(cold),
+            'steps': steps,
+            # Medians over the runs; 'first' is each route's first request in a fresh process,
+            # 'repeat' the same route requested again in that process
+            'routes': {
+                route: {
+                    'cold_first_ms': median([run['first_ms'][route] for run in cold]),
+                    'warm_first_ms': median([run['first_ms'][route] for run in warm]),
+                    'repeat_ms': median([run['repeat_ms'][route] for run in cold + warm]),
+                }
+                for route in routes
+            },
+            'cold_first_request_ms': median([run['first_ms'][routes[0]] for run in cold]),
+            'warm_first_request_ms': median([run['first_ms'][routes[0]] for run in warm]),
+            'warm_up_ms': median([run['warm_up_ms'] for run in warm]),
+            'warm_up_steps_ms': {
+                step: median([run['steps_ms'][step] for run in warm if step in run['steps_ms']])
+                for step in steps
+            },
+        }
@@ -0,0 +1,25 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from core_app.archive import rebuild_summaries
+from core_app.bs_calendar import DEFAULT_START, DEFAULT_END, build_calendar
+from core_app.models import ArchivedSummary
+
+
+class Command(BaseCommand):
+    help = "Populate the Gregorian → Bikram Sambat calendar table used by BS reports."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, default=DEFAULT_START,
+                            help='first Gregorian date (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, default=DEFAULT_END,
+                            help='last Gregorian date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        created = build_calendar(options['start'], options['end'])
+        self.stdout.write(self.style.SUCCESS(f"Added {created} calendar days."))
+        if created and ArchivedSummary.objects.exists():
+            # Archived totals are bucketed by BS month; re-bucket those stored before these days existed
+            summarised = rebuild_summaries()
+            self.stdout.write(self.style.SUCCESS(
+                f"Re-summarised {summarised['expense']} archived expenses and {summarised['income']} incomes."
+            ))
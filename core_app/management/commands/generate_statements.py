@@ -0,0 +1,41 @@
+import time
+from datetime import date, datetime
+from django.core.management.base import BaseCommand, CommandError
+from core_app.statements import generate_statements, statement_dir
+
+
+def parse_month(text):
+    return datetime.strptime(text, '%Y-%m').date()
+
+
+class Command(BaseCommand):
+    help = "Write a statement PDF for every user with transactions in a month, resuming an interrupted run."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', type=parse_month, default=None,
+                            help='YYYY-MM (default: the previous month)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='worker processes (default: one per core)')
+        parser.add_argument('--restart', action='store_true',
+                            help='ignore the checkpoint and render every statement again')
+
+    def handle(self, *args, **options):
+        month = options['month'] or (date.today().replace(day=1) - date.resolution).replace(day=1)
+        started = time.perf_counter()
+        try:
+            written, skipped, failed = generate_statements(
+                month, workers=options['workers'], restart=options['restart'],
+            )
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        for user_id, error in sorted(failed.items()):
+            self.stderr.write(f"User {user_id}: {error}")
+        rate = f" ({written / elapsed:.1f}/s)" if written and elapsed else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} statements for {month:%Y-%m} to {statement_dir(month)} in {elapsed:.1f}s{rate}; "
+            f"{skipped} already done, {len(failed)} failed."
+        ))
+        if failed:
+            raise CommandError('Some statements failed; run the command again to retry them.')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from core_app.currency import load_rates
+
+
+class Command(BaseCommand):
+    help = "Import exchange rates (value of one unit in DEFAULT_CURRENCY) from a date,currency,rate CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with date,currency,rate columns')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        count = load_rates(options['path'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Loaded {count} exchange rates."))
@@ -0,0 +1,41 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from core_app.loadtest import DEFAULT_MIX, LoadTest, parse_mix
+
+
+class Command(BaseCommand):
+    help = "Drive a mix of dashboard/report/expense requests through the in-process app and report latency as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='synthetic users, one session each')
+        parser.add_argument('--rate', type=float, default=20.0, help='target requests per second overall')
+        parser.add_argument('--duration', type=float, default=30.0, help='seconds to run')
+        parser.add_argument('--mix', default=','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items()),
+                            help='weighted routes, e.g. dashboard=5,reports=2,reports_pdf=1,add_expense=2')
+        parser.add_argument('--history', type=int, default=200,
+                            help='expenses seeded for each new synthetic user')
+        parser.add_argument('--host', default='localhost', help='Host header; must be allowed by ALLOWED_HOSTS')
+        parser.add_argument('--seed', type=int, default=None, help='random seed for a repeatable schedule')
+        parser.add_argument('--output', default=None, help='write the JSON report here instead of stdout')
+        parser.add_argument('--cleanup', action='store_true', help='delete the synthetic users afterwards')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as exc:
+            raise CommandError(exc)
+        if options['users'] < 1 or options['rate'] <= 0 or options['duration'] <= 0:
+            raise CommandError('--users, --rate and --duration must be positive.')
+
+        load_test = LoadTest(users=options['users'], rate=options['rate'], duration=options['duration'],
+                             mix=mix, history=options['history'], host=options['host'], seed=options['seed'])
+        report = json.dumps(load_test.run(), indent=2)
+        if options['cleanup']:
+            LoadTest.cleanup()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                fh.write(report + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote load test report to {options['output']}."))
+        else:
+            self.stdout.write(report)
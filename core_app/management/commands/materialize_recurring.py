@@ -0,0 +1,84 @@
+from collections import defaultdict
+from datetime import date
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core_app.algorithms.anomaly_detector import AnomalyDetector
+from core_app.algorithms.budget_tracker import BudgetTracker
+from core_app import data_version
+from core_app.currency import attach_base_amounts
+from core_app.models import Expense, Income, RecurringRule
+
+
+# Throughput: about 21 s for 100,000 due rules on SQLite, not "within seconds". Stats and counters
+# take ~2 s of it; the rest is the ORM building and bulk-inserting one row per occurrence (~10 s for
+# the INSERTs alone). Going faster means raw INSERT ... SELECT SQL, which the app does not use.
+class Command(BaseCommand):
+    help = "Create the Expense/Income rows for every recurring rule occurrence that is due."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until', type=date.fromisoformat, default=None,
+                            help='materialise occurrences up to this date (default: today)')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='rules processed per transaction')
+
+    def handle(self, *args, **options):
+        until = options['until'] or date.today()
+        batch_size = options['batch_size']
+        due = RecurringRule.objects.filter(active=True, next_run__lte=until).order_by('id')
+
+        rules_done = created = 0
+        last_id = 0
+        while True:
+            # Keyset pagination: rules leave the due set as they advance
+            rules = list(due.filter(id__gt=last_id)[:batch_size])
+            if not rules:
+                break
+            last_id = rules[-1].id
+            created += self.materialise(rules, until)
+            rules_done += len(rules)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {rules_done} rules, created {created} transactions up to {until}."
+        ))
+
+    def materialise(self, rules, until):
+        expenses, incomes = [], []
+        for rule in rules:
+            target = incomes if rule.kind == RecurringRule.INCOME else expenses
+            target.extend(rule.build_transaction(day) for day in rule.occurrences_until(until))
+
+        with transaction.atomic():
+            # Skip occurrences already written by an earlier, interrupted run
+            expenses = self.unwritten(Expense, expenses)
+            incomes = self.unwritten(Income, incomes)
+            attach_base_amounts(expenses)
+            AnomalyDetector.record_many(expenses)
+            BudgetTracker.record_many(expenses)
+            Expense.objects.bulk_create(expenses, batch_size=1000)
+            Income.objects.bulk_create(incomes, batch_size=1000)
+            self.advance(rules)
+            data_version.bump(*(row.user_id for row in expenses), kinds=['expense'])
+            data_version.bump(*(row.user_id for row in incomes), kinds=['income'])
+        return len(expenses) + len(incomes)
+
+    @staticmethod
+    def advance(rules):
+        """Persist the new next_run/active values with one UPDATE per distinct value pair."""
+        groups = defaultdict(list)
+        for rule in rules:
+            groups[(rule.next_run, rule.active)].append(rule.id)
+        for (next_run, active), ids in groups.items():
+            RecurringRule.objects.filter(id__in=ids).update(next_run=next_run, active=active)
+
+    @staticmethod
+    def unwritten(model, rows):
+        if not rows:
+            return rows
+        rule_ids = {row.recurring_rule_id for row in rows}
+        start = min(row.date for row in rows)
+        # Tombstones count too: an occurrence the user deleted stays deleted
+        existing = set(
+            model.all_objects.filter(recurring_rule_id__in=rule_ids, date__gte=start)
+                         .values_list('recurring_rule_id', 'date')
+        )
+        return [row for row in rows if (row.recurring_rule_id, row.date) not in existing]
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from core_app.sync import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = "Permanently remove sync tombstones older than SYNC_TOMBSTONE_DAYS."
+
+    def handle(self, *args, **options):
+        purged = purge_tombstones()
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {purged['expense']} expense and {purged['income']} income tombstones."
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from core_app.algorithms.budget_tracker import BudgetTracker
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-category monthly spend counters used by category budgets."
+
+    def handle(self, *args, **options):
+        counters = BudgetTracker.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {counters} monthly spend counters."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from core_app.algorithms.anomaly_detector import AnomalyDetector
+
+
+class Command(BaseCommand):
+    help = "Rebuild per-category expense statistics and anomaly flags from history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=AnomalyDetector.THRESHOLD,
+                            help='z-score above which an expense is flagged')
+        parser.add_argument('--min-samples', type=int, default=AnomalyDetector.MIN_SAMPLES,
+                            help='prior expenses needed in a category before flagging')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        stats, anomalies = AnomalyDetector.rebuild(
+            threshold=options['threshold'],
+            min_samples=options['min_samples'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {stats} category stats, flagged {anomalies} anomalous expenses."
+        ))
@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from core_app.replica import refresh_replica
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database onto the read replica file with SQLite's backup API."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='keep refreshing every INTERVAL seconds instead of once')
+        parser.add_argument('--pages', type=int, default=-1,
+                            help='pages copied per backup step (-1: all at once)')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            try:
+                refresh_replica(pages=options['pages'])
+            except RuntimeError as exc:
+                raise CommandError(exc)
+            self.stdout.write(self.style.SUCCESS(
+                f"Replica refreshed in {time.perf_counter() - started:.2f}s."
+            ))
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
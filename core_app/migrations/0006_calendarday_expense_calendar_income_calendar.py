@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_app', '0005_expense_is_anomaly_categorystat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarDay',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('bs_year', models.PositiveSmallIntegerField()),
+                ('bs_month', models.PositiveSmallIntegerField()),
+                ('bs_day', models.PositiveSmallIntegerField()),
+                ('fiscal_year', models.PositiveSmallIntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bs_year', 'bs_month'], name='calendarday_bs_month_idx'), models.Index(fields=['fiscal_year'], name='calendarday_fiscal_year_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='calendar',
+            field=models.ForeignObject(from_fields=['date'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core_app.calendarday', to_fields=['date']),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='calendar',
+            field=models.ForeignObject(from_fields=['date'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core_app.calendarday', to_fields=['date']),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_app', '0008_categorybudget_categoryspend'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('expense', 'Expense'), ('income', 'Income')], max_length=10)),
+                ('date', models.DateField()),
+                ('amount', models.FloatField(default=0)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('calendar', models.ForeignObject(from_fields=['date'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core_app.calendarday', to_fields=['date'])),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='core_app.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'kind', 'category', 'date'), name='unique_archived_summary')],
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:44
+
+import core_app.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_app', '0011_expense_is_deleted_expense_updated_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrencyPreference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('base_currency', models.CharField(choices=core_app.models.currency_choices, default=core_app.models.default_currency, max_length=3)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3)),
+                ('date', models.DateField()),
+                ('rate', models.FloatField()),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='archivedsummary',
+            name='unique_archived_summary',
+        ),
+        migrations.AddField(
+            model_name='archivedsummary',
+            name='currency',
+            field=models.CharField(choices=core_app.models.currency_choices, default=core_app.models.default_currency, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='currency',
+            field=models.CharField(choices=core_app.models.currency_choices, default=core_app.models.default_currency, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='currency',
+            field=models.CharField(choices=core_app.models.currency_choices, default=core_app.models.default_currency, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='recurringrule',
+            name='currency',
+            field=models.CharField(choices=core_app.models.currency_choices, default=core_app.models.default_currency, max_length=3),
+        ),
+        migrations.AddConstraint(
+            model_name='archivedsummary',
+            constraint=models.UniqueConstraint(fields=('user', 'kind', 'category', 'currency', 'date'), name='unique_archived_summary'),
+        ),
+        migrations.AddField(
+            model_name='currencypreference',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='currency_preference', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='exchangerate',
+            constraint=models.UniqueConstraint(fields=('currency', 'date'), name='unique_exchange_rate'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:13
+
+import django.core.validators
+from django.conf import settings
+from django.db import migrations, models
+
+
+def repair_zero_intervals(apps, schema_editor):
+    # Saved before the constraint; materialize_recurring would loop on them forever
+    apps.get_model('core_app', 'RecurringRule').objects.filter(interval=0).update(interval=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_app', '0012_currencypreference_exchangerate_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recurringrule',
+            name='interval',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1, 'Interval must be at least 1.')]),
+        ),
+        migrations.RunPython(repair_zero_intervals, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='recurringrule',
+            constraint=models.CheckConstraint(condition=models.Q(('interval__gte', 1)), name='recurringrule_interval_positive'),
+        ),
+    ]
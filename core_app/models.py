@@ -1,5 +1,10 @@
+import calendar
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Expense category
 class Category(models.Model):
@@ -17,13 +22,188 @@ class IncomeCategory(models.Model):
         return self.name
 
 
+# Gregorian → Bikram Sambat calendar dimension, joined to transactions by date
+class CalendarDay(models.Model):
+    date = models.DateField(primary_key=True)
+    bs_year = models.PositiveSmallIntegerField()
+    bs_month = models.PositiveSmallIntegerField()
+    bs_day = models.PositiveSmallIntegerField()
+    fiscal_year = models.PositiveSmallIntegerField()  # BS year in which the fiscal year starts (Shrawan 1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bs_year', 'bs_month'], name='calendarday_bs_month_idx'),
+            models.Index(fields=['fiscal_year'], name='calendarday_fiscal_year_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} = {self.bs_year}-{self.bs_month:02d}-{self.bs_day:02d}"
+
+
+def calendar_relation():
+    """Column-less join from a transaction's date to its CalendarDay row."""
+    return models.ForeignObject(
+        CalendarDay,
+        on_delete=models.DO_NOTHING,
+        from_fields=['date'],
+        to_fields=['date'],
+        related_name='+',
+        null=True,
+    )
+
+
+def currency_choices():
+    return [(code, f"{code} ({symbol})") for code, symbol in settings.CURRENCIES.items()]
+
+
+def default_currency():
+    return settings.DEFAULT_CURRENCY
+
+
+# Value of one unit of ``currency`` in DEFAULT_CURRENCY on ``date``
+class ExchangeRate(models.Model):
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'date'], name='unique_exchange_rate'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} 1 {self.currency} = {self.rate}"
+
+
+# Currency a user's totals and budgets are reported in
+class CurrencyPreference(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='currency_preference')
+    base_currency = models.CharField(max_length=3, choices=currency_choices, default=default_currency)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.base_currency}"
+
+
+def add_months(anchor, months):
+    """Shift ``anchor`` by whole months, clamping the day to the month length."""
+    month_index = anchor.month - 1 + months
+    year, month = anchor.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(anchor.day, calendar.monthrange(year, month)[1]))
+
+
+# Schedule that materialises an Expense or Income on every occurrence
+class RecurringRule(models.Model):
+    EXPENSE = 'expense'
+    INCOME = 'income'
+    KIND_CHOICES = [(EXPENSE, 'Expense'), (INCOME, 'Income')]
+
+    DAILY = 'daily'
+    WEEKLY = 'weekly'
+    MONTHLY = 'monthly'
+    YEARLY = 'yearly'
+    FREQUENCY_CHOICES = [(DAILY, 'Daily'), (WEEKLY, 'Weekly'), (MONTHLY, 'Monthly'), (YEARLY, 'Yearly')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=EXPENSE)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
+    amount = models.FloatField()
+    currency = models.CharField(max_length=3, choices=currency_choices, default=default_currency)
+    description = models.TextField(blank=True, null=True)
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default=MONTHLY)
+    # 0 would make following() return the same day, and materialize_recurring loop forever
+    interval = models.PositiveSmallIntegerField(
+        default=1, validators=[MinValueValidator(1, 'Interval must be at least 1.')]
+    )
+    start_date = models.DateField()
+    end_date = models.DateField(blank=True, null=True)
+    next_run = models.DateField(editable=False)  # first occurrence not yet materialised
+    active = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=models.Q(interval__gte=1), name='recurringrule_interval_positive'),
+        ]
+        indexes = [
+            models.Index(fields=['active', 'next_run'], name='recurringrule_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.get_frequency_display()} {self.kind} - {self.amount}"
+
+    def save(self, *args, **kwargs):
+        if self.next_run is None:
+            self.next_run = self.start_date
+        super().save(*args, **kwargs)
+
+    def following(self, occurrence):
+        """Return the occurrence after ``occurrence``, computed from the start date so month-end days don't drift."""
+        if self.frequency == self.DAILY:
+            return occurrence + timedelta(days=self.interval)
+        if self.frequency == self.WEEKLY:
+            return occurrence + timedelta(weeks=self.interval)
+        step = self.interval if self.frequency == self.MONTHLY else 12 * self.interval
+        elapsed = (occurrence.year - self.start_date.year) * 12 + occurrence.month - self.start_date.month
+        return add_months(self.start_date, elapsed + step)
+
+    def occurrences_until(self, until):
+        """Yield every occurrence from ``next_run`` up to ``until`` (inclusive) and advance ``next_run``."""
+        if self.end_date and self.end_date < until:
+            until = self.end_date
+        occurrence = self.next_run
+        while occurrence <= until:
+            yield occurrence
+            occurrence = self.following(occurrence)
+        self.next_run = occurrence
+        if self.end_date and occurrence > self.end_date:
+            self.active = False
+
+    def build_transaction(self, occurrence):
+        """Unsaved Expense or Income for one occurrence."""
+        if self.kind == self.INCOME:
+            return Income(user_id=self.user_id, amount=self.amount, currency=self.currency,
+                          description=self.description, date=occurrence, recurring_rule_id=self.pk)
+        return Expense(user_id=self.user_id, category_id=self.category_id, amount=self.amount,
+                       currency=self.currency, description=self.description, date=occurrence,
+                       recurring_rule_id=self.pk)
+
+
+class TransactionQuerySet(models.QuerySet):
+    def soft_delete(self):
+        """Turn rows into tombstones so syncing clients learn about the delete."""
+        return self.update(is_deleted=True, updated_at=timezone.now())
+
+
+class LiveTransactionManager(models.Manager.from_queryset(TransactionQuerySet)):
+    """Default manager: hides tombstones from every report, form and total."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
 # Expense model
 class Expense(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     amount = models.FloatField()
+    currency = models.CharField(max_length=3, choices=currency_choices, default=default_currency)
     description = models.TextField(blank=True, null=True)
     date = models.DateField()
+    is_anomaly = models.BooleanField(default=False)
+    recurring_rule = models.ForeignKey(RecurringRule, on_delete=models.SET_NULL, null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    is_deleted = models.BooleanField(default=False, editable=False)
+    calendar = calendar_relation()
+
+    objects = LiveTransactionManager()
+    all_objects = TransactionQuerySet.as_manager()  # includes tombstones
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recurring_rule', 'date'], name='unique_expense_occurrence'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'updated_at', 'id'], name='expense_changes_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.category.name if self.category else 'No Category'} - {self.amount}"
@@ -33,8 +213,147 @@ class Expense(models.Model):
 class Income(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     amount = models.FloatField()
+    currency = models.CharField(max_length=3, choices=currency_choices, default=default_currency)
     description = models.TextField(blank=True, null=True)  # Added field
     date = models.DateField()
+    recurring_rule = models.ForeignKey(RecurringRule, on_delete=models.SET_NULL, null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    is_deleted = models.BooleanField(default=False, editable=False)
+    calendar = calendar_relation()
+
+    objects = LiveTransactionManager()
+    all_objects = TransactionQuerySet.as_manager()  # includes tombstones
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recurring_rule', 'date'], name='unique_income_occurrence'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'updated_at', 'id'], name='income_changes_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.amount}"
+
+
+# Running expense statistics per (user, category), kept with Welford updates
+class CategoryStat(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True)
+    count = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0)
+    m2 = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category'], name='unique_category_stat'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.category.name if self.category else 'No Category'} - n={self.count}"
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        return (self.m2 / (self.count - 1)) ** 0.5
+
+    def push(self, amount):
+        self.count += 1
+        delta = amount - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (amount - self.mean)
+
+    def merge(self, other):
+        """Add the amounts counted by ``other`` (used when a category is deleted)."""
+        count = self.count + other.count
+        if not count:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    def pop(self, amount):
+        """Reverse a previous push of ``amount`` (used on edit and delete)."""
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        previous_mean = (self.count * self.mean - amount) / (self.count - 1)
+        self.m2 = max(self.m2 - (amount - previous_mean) * (amount - self.mean), 0.0)
+        self.mean = previous_mean
+        self.count -= 1
+
+
+# Monthly spending limit for one expense category
+class CategoryBudget(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    monthly_limit = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category'], name='unique_category_budget'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.category.name} - {self.monthly_limit}"
+
+
+# Running "spent this month" counter per (user, category, month)
+class CategorySpend(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True)
+    month = models.DateField()  # first day of the month
+    spent = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category', 'month'], name='unique_category_spend'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.category.name if self.category else 'No Category'} - {self.month:%Y-%m} - {self.spent}"
+
+
+# Totals of archived transactions per bucket: fixed report weeks (days 1, 8, 15, 22 of the
+# month) split where a BS month begins (core_app.archive.summary_buckets).
+# Shares Expense's amount/date/category shape so report queries run on it unchanged.
+class ArchivedSummary(models.Model):
+    EXPENSE = 'expense'
+    INCOME = 'income'
+    KIND_CHOICES = [(EXPENSE, 'Expense'), (INCOME, 'Income')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
+    date = models.DateField()  # first day of the bucket
+    amount = models.FloatField(default=0)
+    currency = models.CharField(max_length=3, choices=currency_choices, default=default_currency)
+
+    count = models.PositiveIntegerField(default=0)
+    calendar = calendar_relation()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'kind', 'category', 'currency', 'date'], name='unique_archived_summary'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.kind} - {self.date} - {self.amount}"
+
+
+# Result of a batch-write operation, replayed when a client retries the same key
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=64)
+    result = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.key}"
@@ -0,0 +1,123 @@
+"""
+Read-replica routing.
+
+Views decorated with ``read_from_replica`` send their reads to the ``replica``
+database alias; every write, and every read outside those views, uses
+``default``. A request that writes sets a short-lived cookie so the user's next
+request reads from the primary and sees its own changes even if the replica
+has not caught up yet.
+
+Locally the replica is a second SQLite file copied from the primary with
+SQLite's online backup API (``refresh_replica``).
+"""
+import sqlite3
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+REPLICA = 'replica'
+PRIMARY = 'default'
+PIN_COOKIE = 'pin_primary'
+# Sessions and accounts are always read from the primary so a fresh login never looks logged out
+PRIMARY_ONLY_APPS = {'auth', 'sessions', 'contenttypes'}
+
+# Alias reads go to for the code running in this context
+_read_alias = ContextVar('read_alias', default=PRIMARY)
+# Set to a list by ReplicaPinMiddleware; the router appends to it on every write
+_writes = ContextVar('writes', default=None)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return PRIMARY
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        writes = _writes.get()
+        if writes is not None:
+            writes.append(model._meta.label)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of the primary, so rows from either may be related
+        return {obj1._state.db, obj2._state.db} <= {PRIMARY, REPLICA}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica's schema arrives with its data through refresh_replica
+        return db == PRIMARY
+
+
+def read_from_replica(view_func):
+    """
+    Route the reads of ``view_func`` to the replica, unless none is configured
+    or the user wrote something in their previous request. Use
+    ``method_decorator(read_from_replica, name='dispatch')`` on class-based views.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not replica_configured() or getattr(request, 'pin_primary', False):
+            return view_func(request, *args, **kwargs)
+        token = _read_alias.set(REPLICA)
+        try:
+            response = view_func(request, *args, **kwargs)
+            # A TemplateResponse renders after the view returns; its lazy querysets must run here
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+            return response
+        finally:
+            _read_alias.reset(token)
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    """
+    Pin the next request after a write to the primary.
+
+    Only writes made while handling the request are counted; the pin is a
+    cookie so setting it does not itself write to the database.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.pin_primary = request.COOKIES.get(PIN_COOKIE) == '1'
+        writes = []
+        token = _writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _writes.reset(token)
+        if writes and replica_configured():
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        elif request.pin_primary:
+            response.delete_cookie(PIN_COOKIE)
+        return response
+
+
+def refresh_replica(pages=-1):
+    """
+    Copy the primary SQLite database onto the replica file with the online
+    backup API; readers of the replica keep working while it runs.
+
+    :param pages: pages copied per step (-1 copies everything in one step)
+    """
+    if not replica_configured():
+        raise RuntimeError(f"No '{REPLICA}' database is configured.")
+    for alias in (PRIMARY, REPLICA):
+        if connections[alias].vendor != 'sqlite':
+            raise RuntimeError('refresh_replica only copies SQLite databases; use the server\'s own replication.')
+    primary = connections[PRIMARY]
+    primary.ensure_connection()
+    target = sqlite3.connect(settings.DATABASES[REPLICA]['NAME'])
+    try:
+        primary.connection.backup(target, pages=pages)
+    finally:
+        target.close()
@@ -0,0 +1,232 @@
+"""
+Month-end statement PDFs for every user.
+
+``collect_statements`` reads the month's totals for all users with a few
+grouped queries (live expenses, live incomes, archived summaries, plus names
+and currencies); ``generate_statements`` then renders one PDF per user in a
+process pool. Workers only draw charts and run PDFRenderer, so they never
+touch the database and the run scales with the number of cores.
+
+Files go to MEDIA_ROOT/statements/YYYY-MM/<user id>.pdf. Every finished file
+is appended to ``progress.jsonl`` in the same directory; a later run skips the
+users listed there, so an interrupted run resumes where it stopped.
+"""
+import json
+import os
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import Sum
+
+from core_app.category_cache import categories
+from core_app.currency import currency_symbol, in_base_currency
+from core_app.models import ArchivedSummary, CurrencyPreference, Expense, Income
+from core_app.views import ChartGenerator, PDFRenderer
+
+STATEMENTS_DIR = 'statements'
+PROGRESS_FILE = 'progress.jsonl'
+WEEKS = ['First Week', 'Second Week', 'Third Week', 'Fourth Week']
+
+
+def month_bounds(month):
+    """First day of ``month`` (a date in it) and of the month after."""
+    start = month.replace(day=1)
+    end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+def statement_dir(month):
+    return Path(settings.MEDIA_ROOT) / STATEMENTS_DIR / month.strftime('%Y-%m')
+
+
+def _week_index(day):
+    # Same fixed weeks as the reports: 1–7, 8–14, 15–21, 22–end
+    return min((day.day - 1) // 7, 3)
+
+
+def collect_statements(month, user_ids=None):
+    """
+    Summary data for every user with transactions in ``month``, as plain
+    dicts that can be sent to worker processes.
+
+    :param user_ids: only these users (default: everyone)
+    """
+    start, end = month_bounds(month)
+    in_month = {'date__gte': start, 'date__lt': end}
+    if user_ids is not None:
+        in_month['user_id__in'] = user_ids
+
+    weeks = defaultdict(lambda: [[0.0, 0.0] for _ in WEEKS])  # user -> [[expenses, incomes]] per week
+    spent = defaultdict(lambda: defaultdict(float))           # user -> category id -> total
+
+    # Live rows grouped by (user, day[, category]); archived summaries already hold week totals
+    expense_rows = (
+        in_base_currency(Expense.objects.filter(**in_month))
+        .values('user_id', 'category_id', 'date').annotate(total=Sum('base_amount')).order_by()
+    )
+    income_rows = (
+        in_base_currency(Income.objects.filter(**in_month))
+        .values('user_id', 'date').annotate(total=Sum('base_amount')).order_by()
+    )
+    archived_rows = (
+        in_base_currency(ArchivedSummary.objects.filter(**in_month))
+        .values('user_id', 'kind', 'category_id', 'date').annotate(total=Sum('base_amount')).order_by()
+    )
+    for row in expense_rows:
+        weeks[row['user_id']][_week_index(row['date'])][0] += row['total']
+        spent[row['user_id']][row['category_id']] += row['total']
+    for row in income_rows:
+        weeks[row['user_id']][_week_index(row['date'])][1] += row['total']
+    for row in archived_rows:
+        if row['kind'] == ArchivedSummary.EXPENSE:
+            weeks[row['user_id']][_week_index(row['date'])][0] += row['total']
+            spent[row['user_id']][row['category_id']] += row['total']
+        else:
+            weeks[row['user_id']][_week_index(row['date'])][1] += row['total']
+
+    usernames = dict(User.objects.filter(id__in=weeks).values_list('id', 'username'))
+    bases = dict(CurrencyPreference.objects.filter(user_id__in=weeks).values_list('user_id', 'base_currency'))
+
+    statements = []
+    for user_id in sorted(weeks):
+        total_expense = sum(expenses for expenses, _ in weeks[user_id])
+        total_income = sum(incomes for _, incomes in weeks[user_id])
+        named = defaultdict(float)
+        for category_id, total in spent[user_id].items():
+            named[categories.name(category_id)] += total
+        statements.append({
+            'user_id': user_id,
+            'username': usernames.get(user_id, str(user_id)),
+            'month': start.isoformat(),
+            'currency_symbol': currency_symbol(bases.get(user_id, settings.DEFAULT_CURRENCY)),
+            'weekly_summary': [
+                {'period': label, 'expenses': round(expenses, 2), 'incomes': round(incomes, 2)}
+                for label, (expenses, incomes) in zip(WEEKS, weeks[user_id])
+            ],
+            'expense_category': sorted(
+                ({'category': name, 'total': round(total, 2)} for name, total in named.items()),
+                key=lambda row: row['total'], reverse=True,
+            ),
+            'total_expense': round(total_expense, 2),
+            'total_income': round(total_income, 2),
+            'balance': round(total_income - total_expense, 2),
+        })
+    return statements
+
+
+def render_statement(statement, directory):
+    """
+    Draw the charts and write ``statement``'s PDF into ``directory``.
+    Runs in a worker process and reads nothing from the database.
+
+    :return: (user_id, file name, size in bytes)
+    """
+    weekly = statement['weekly_summary']
+    with tempfile.TemporaryDirectory(prefix='statement-charts-') as charts:
+        fmt = settings.PDF_CHART_FORMAT
+        weekly_chart = ChartGenerator('Weekly Income vs Expense', 'bar', fmt=fmt).plot(
+            [w['period'] for w in weekly],
+            [
+                {'label': 'Expenses', 'data': [w['expenses'] for w in weekly], 'color': 'red'},
+                {'label': 'Incomes', 'data': [w['incomes'] for w in weekly], 'color': 'green'}
+            ],
+            directory=charts,
+        )
+        category_chart = None
+        if statement['expense_category']:
+            category_chart = ChartGenerator('Expenses by Category', 'pie', fmt=fmt).plot(
+                [c['category'] for c in statement['expense_category']],
+                [{
+                    'data': [c['total'] for c in statement['expense_category']],
+                    'colors': ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF']
+                }],
+                directory=charts,
+            )
+        context = dict(
+            statement,
+            month=date.fromisoformat(statement['month']),
+            weekly_chart=weekly_chart,
+            category_chart=category_chart,
+        )
+        response = PDFRenderer('statement_pdf.html', context, asset_dir=charts).render()
+    if response['Content-Type'] != 'application/pdf':
+        raise RuntimeError(f"xhtml2pdf could not render the statement of user {statement['user_id']}.")
+
+    name = f"{statement['user_id']}.pdf"
+    path = Path(directory) / name
+    partial = path.with_suffix('.pdf.part')
+    partial.write_bytes(response.content)
+    # Renamed into place only once complete, so a crash never leaves a truncated statement
+    os.replace(partial, path)
+    return statement['user_id'], name, len(response.content)
+
+
+def completed_users(directory):
+    """User ids recorded in the checkpoint whose files are still there."""
+    done = set()
+    try:
+        with open(Path(directory) / PROGRESS_FILE, encoding='utf-8') as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # last line cut short by an interruption
+                if (Path(directory) / entry['file']).exists():
+                    done.add(entry['user_id'])
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def generate_statements(month, workers=None, restart=False, user_ids=None, progress=None):
+    """
+    Write the statements for ``month`` that are not already done.
+
+    :param workers: size of the process pool (default: one per core)
+    :param restart: ignore the checkpoint and render every statement again
+    :param progress: optional callable(user_id, file name, size) called as each file is written
+    :return: (statements written, statements skipped from the checkpoint,
+        {user_id: error} for statements that failed and will be retried next run)
+    """
+    if not PDFRenderer.available():
+        raise RuntimeError('Statements need xhtml2pdf; install it with "pip install xhtml2pdf".')
+    directory = statement_dir(month)
+    directory.mkdir(parents=True, exist_ok=True)
+    checkpoint = directory / PROGRESS_FILE
+    if restart and checkpoint.exists():
+        checkpoint.unlink()
+
+    done = completed_users(directory)
+    pending = [s for s in collect_statements(month, user_ids) if s['user_id'] not in done]
+    if not pending:
+        return 0, len(done), {}
+
+    # Workers must not share the parent's database connections
+    connections.close_all()
+    written, failed = 0, {}
+    # django.setup() prepares the app registry in workers started with spawn/forkserver
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool, \
+            open(checkpoint, 'a', encoding='utf-8') as log:
+        futures = {
+            pool.submit(render_statement, statement, str(directory)): statement['user_id']
+            for statement in pending
+        }
+        for future in as_completed(futures):
+            try:
+                user_id, name, size = future.result()
+            except Exception as e:
+                failed[futures[future]] = str(e)
+                continue
+            log.write(json.dumps({'user_id': user_id, 'file': name, 'bytes': size}) + '\n')
+            log.flush()
+            written += 1
+            if progress is not None:
+                progress(user_id, name, size)
+    return written, len(done), failed
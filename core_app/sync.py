@@ -0,0 +1,359 @@
+"""
+Client sync: batched writes and delta reads.
+
+An offline client sends its queued expense/income operations in one request.
+``BatchWriter`` validates the whole batch with a handful of queries, then applies
+it in a single transaction with bulk_create/bulk_update. Operations carrying an
+idempotency key are recorded, so a retried batch replays the stored results
+instead of writing twice.
+
+``ChangeFeed`` serves the other direction: rows (and tombstones) changed after
+an opaque cursor, read in (user, updated_at, id) index order.
+"""
+import base64
+import json
+from datetime import date, datetime, timedelta
+
+from django import forms
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core_app.algorithms.anomaly_detector import AnomalyDetector
+from core_app.algorithms.budget_tracker import BudgetTracker
+from core_app import data_version
+from core_app.category_cache import categories
+from core_app.currency import attach_base_amounts
+from core_app.forms import ExpenseForm, IncomeForm
+from core_app.models import Expense, IdempotencyKey, Income
+
+OPERATIONS = ('create', 'update', 'delete')
+MODELS = {'expense': Expense, 'income': Income}
+FORMS = {'expense': ExpenseForm, 'income': IncomeForm}
+
+
+class BatchError(Exception):
+    """The batch was rejected; ``errors`` lists problems per operation index."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+class BatchWriter:
+    def __init__(self, user, max_operations=None):
+        """
+        :param user: owner of every transaction touched by the batch
+        :param max_operations: batch size limit (defaults to BATCH_WRITE_MAX_OPERATIONS)
+        """
+        self.user = user
+        self.max_operations = max_operations or settings.BATCH_WRITE_MAX_OPERATIONS
+
+    def apply(self, operations):
+        """
+        Validate and apply ``operations`` atomically.
+
+        :param operations: list of {'op', 'type', 'id'?, 'key'?, 'data'?} dicts
+        :return: one result dict per operation, in request order
+        :raises BatchError: nothing was written
+        """
+        if not isinstance(operations, list) or not operations:
+            raise BatchError([{'index': None, 'errors': {'operations': ['Expected a non-empty list.']}}])
+        if len(operations) > self.max_operations:
+            raise BatchError([{'index': None, 'errors': {
+                'operations': [f'At most {self.max_operations} operations per batch.']
+            }}])
+
+        errors = []
+        for index, operation in enumerate(operations):
+            problems = self._check_shape(operation)
+            if problems:
+                errors.append({'index': index, 'errors': problems})
+        if errors:
+            raise BatchError(errors)
+
+        replayed = self._replayed(operations)
+        pending = [(i, op) for i, op in enumerate(operations) if op.get('key') not in replayed]
+        targets = self._load_targets(pending)
+        category_ids = self._known_categories(pending)
+
+        cleaned = {}
+        # Each row is changed at most once per batch: _write snapshots its previous values per operation
+        first_use = {}
+        for index, operation in pending:
+            problems = {}
+            if operation['op'] != 'create':
+                target = (operation['type'], operation['id'])
+                if target in first_use:
+                    problems['id'] = [f"Operation {first_use[target]} already changes this {operation['type']}; "
+                                      f"send one operation per row."]
+                else:
+                    first_use[target] = index
+                    if operation['id'] not in targets[operation['type']]:
+                        problems['id'] = [f"No {operation['type']} with id {operation['id']}."]
+            if operation['op'] != 'delete':
+                data, field_errors = self._clean_data(operation, category_ids)
+                problems.update(field_errors)
+                cleaned[index] = data
+            if problems:
+                errors.append({'index': index, 'errors': problems})
+        if errors:
+            raise BatchError(errors)
+
+        with transaction.atomic():
+            results = self._write(pending, cleaned, targets)
+            if results:
+                data_version.bump(self.user.id, kinds={operation['type'] for _, operation in pending})
+            IdempotencyKey.objects.bulk_create([
+                IdempotencyKey(user=self.user, key=operations[index]['key'], result=result)
+                for index, result in results.items() if operations[index].get('key')
+            ])
+
+        for index, operation in enumerate(operations):
+            if index not in results:
+                results[index] = dict(replayed[operation['key']], replayed=True)
+        return [results[index] for index in range(len(operations))]
+
+    # ---------------- VALIDATION ----------------
+    @staticmethod
+    def _check_shape(operation):
+        if not isinstance(operation, dict):
+            return {'operation': ['Expected an object.']}
+        problems = {}
+        if operation.get('op') not in OPERATIONS:
+            problems['op'] = [f"Must be one of {', '.join(OPERATIONS)}."]
+        if operation.get('type') not in MODELS:
+            problems['type'] = [f"Must be one of {', '.join(MODELS)}."]
+        if operation.get('op') in ('update', 'delete') and not isinstance(operation.get('id'), int):
+            problems['id'] = ['An integer id is required.']
+        if operation.get('op') in ('create', 'update') and not isinstance(operation.get('data'), dict):
+            problems['data'] = ['An object with field values is required.']
+        key = operation.get('key')
+        if key is not None and (not isinstance(key, str) or not 0 < len(key) <= 64):
+            problems['key'] = ['Must be a string of 1 to 64 characters.']
+        return problems
+
+    def _replayed(self, operations):
+        keys = [op['key'] for op in operations if op.get('key')]
+        if len(keys) != len(set(keys)):
+            raise BatchError([{'index': None, 'errors': {'key': ['Idempotency keys must be unique in a batch.']}}])
+        return dict(
+            IdempotencyKey.objects.filter(user=self.user, key__in=keys).values_list('key', 'result')
+        )
+
+    def _load_targets(self, pending):
+        targets = {}
+        for kind, model in MODELS.items():
+            ids = {op['id'] for _, op in pending if op['type'] == kind and op['op'] != 'create'}
+            targets[kind] = model.objects.filter(user=self.user, id__in=ids).in_bulk() if ids else {}
+        return targets
+
+    @staticmethod
+    def _known_categories(pending):
+        ids = {
+            op['data'].get('category') for _, op in pending
+            if op['type'] == 'expense' and op['op'] != 'delete'
+        }
+        return {i for i in ids if isinstance(i, int) and categories.get(i) is not None}
+
+    @staticmethod
+    def _clean_data(operation, category_ids):
+        """Clean field values with the same form fields the web forms use, minus per-row queries."""
+        form_class = FORMS[operation['type']]
+        data = operation['data']
+        partial = operation['op'] == 'update'
+        cleaned, problems = {}, {}
+        model_fields = form_class._meta.model._meta
+        for name in form_class._meta.fields:
+            if name not in data:
+                # Fields with a model default (e.g. currency) fall back to it, as older clients don't send them
+                if (not partial and form_class.base_fields[name].required
+                        and not model_fields.get_field(name).has_default()):
+                    problems[name] = ['This field is required.']
+                continue
+            value = data[name]
+            if name == 'category':
+                if value not in category_ids:
+                    problems[name] = ['Select a valid choice.']
+                else:
+                    cleaned['category_id'] = value
+                continue
+            try:
+                cleaned[name] = form_class.base_fields[name].clean(value)
+            except forms.ValidationError as exc:
+                problems[name] = exc.messages
+        if cleaned.get('date') and cleaned['date'] > date.today():
+            problems['date'] = ['Date cannot be in the future.']
+        return cleaned, problems
+
+    # ---------------- WRITES ----------------
+    def _write(self, pending, cleaned, targets):
+        results = {}
+        created = {kind: [] for kind in MODELS}
+        updated = {kind: [] for kind in MODELS}
+        deleted = {kind: [] for kind in MODELS}
+        # Expense values before this batch, taken out of the derived stats and counters
+        previous_expenses = []
+
+        for index, operation in pending:
+            kind, model = operation['type'], MODELS[operation['type']]
+            if operation['op'] == 'create':
+                obj = model(user=self.user, **cleaned[index])
+                created[kind].append((index, obj))
+                continue
+            obj = targets[kind][operation['id']]
+            if kind == 'expense':
+                previous_expenses.append(Expense(user_id=obj.user_id, category_id=obj.category_id,
+                                                 amount=obj.amount, currency=obj.currency, date=obj.date))
+            if operation['op'] == 'update':
+                for field, value in cleaned[index].items():
+                    setattr(obj, field, value)
+                updated[kind].append((index, obj))
+            else:
+                deleted[kind].append((index, obj))
+
+        current_expenses = [obj for _, obj in created['expense'] + updated['expense']]
+        attach_base_amounts(previous_expenses + current_expenses)
+        AnomalyDetector.discard_many((e.user_id, e.category_id, e.base_amount) for e in previous_expenses)
+        BudgetTracker.record_many(previous_expenses, sign=-1)
+        AnomalyDetector.record_many(current_expenses)
+        BudgetTracker.record_many(current_expenses)
+
+        for kind, model in MODELS.items():
+            model.objects.bulk_create([obj for _, obj in created[kind]])
+            # bulk_update skips auto_now, so the change cursor is bumped by hand
+            now = timezone.now()
+            for _, obj in updated[kind]:
+                obj.updated_at = now
+            fields = [name for name in FORMS[kind]._meta.fields] + ['updated_at']
+            if kind == 'expense':
+                fields.append('is_anomaly')
+            model.objects.bulk_update([obj for _, obj in updated[kind]], fields)
+            model.objects.filter(id__in=[obj.id for _, obj in deleted[kind]]).soft_delete()
+
+            for status, entries in (('created', created[kind]), ('updated', updated[kind]), ('deleted', deleted[kind])):
+                for index, obj in entries:
+                    results[index] = {'status': status, 'type': kind, 'id': obj.id}
+        return results
+
+
+class CursorExpired(Exception):
+    """The cursor predates the tombstone retention window; the client must resync from scratch."""
+
+
+class ChangeFeed:
+    """
+    Cursors carry a position per table plus the time the client's copy was
+    last complete: when the page that produced it (or, while a run of pages
+    is still ``has_more``, the run's first page) was served. Tombstones of
+    changes after that time are younger than it, so the cursor expires once
+    that time falls outside SYNC_TOMBSTONE_DAYS, whatever the age of the rows.
+
+    ``updated_at`` is stamped by the app before commit, so a slow transaction
+    can become visible after rows with later stamps were served. Rows stamped
+    within the last SYNC_SETTLE_SECONDS are therefore held back until the
+    next call; a transaction that takes longer to commit can still be missed.
+    """
+    # Fields sent for live rows; tombstones only carry type, id and updated_at
+    FIELDS = {
+        'expense': ('category_id', 'amount', 'currency', 'description', 'date', 'is_anomaly'),
+        'income': ('amount', 'currency', 'description', 'date'),
+    }
+
+    def __init__(self, user, page_size=None):
+        """
+        :param user: owner of the rows being synced
+        :param page_size: changes per page (defaults to SYNC_PAGE_SIZE)
+        """
+        self.user = user
+        self.page_size = page_size or settings.SYNC_PAGE_SIZE
+
+    @staticmethod
+    def encode_cursor(issued, positions):
+        raw = json.dumps({
+            'issued': issued.isoformat(),
+            'positions': {kind: [ts.isoformat(), pk] for kind, (ts, pk) in positions.items()},
+        })
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        :return: (issued, {kind: (updated_at, id)}); (None, {}) for a first sync
+        :raises ValueError: malformed cursor
+        """
+        if not cursor:
+            return None, {}
+        try:
+            raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if 'positions' not in raw:
+                raw = {'issued': None, 'positions': raw}  # older cursors held positions only
+            positions = {
+                kind: (datetime.fromisoformat(ts), int(pk))
+                for kind, (ts, pk) in raw['positions'].items() if kind in MODELS
+            }
+            if raw['issued']:
+                issued = datetime.fromisoformat(raw['issued'])
+            else:
+                issued = min((ts for ts, _ in positions.values()), default=None)
+        except (TypeError, AttributeError, KeyError) as exc:
+            raise ValueError('Invalid cursor.') from exc
+        # Cursors are only issued with aware times; a naive one can't be compared with now()
+        times = [issued] + [ts for ts, _ in positions.values()]
+        if any(ts is not None and timezone.is_naive(ts) for ts in times):
+            raise ValueError('Invalid cursor.')
+        return issued, positions
+
+    def page(self, cursor=None):
+        """
+        One page of changes after ``cursor``, oldest first.
+
+        Each table is read from its own position in the cursor, the two
+        streams are merged by updated_at and the cursor advances only past
+        the rows actually returned.
+        """
+        now = timezone.now()
+        issued, positions = self.decode_cursor(cursor)
+        if issued is not None and issued < now - timedelta(days=settings.SYNC_TOMBSTONE_DAYS):
+            raise CursorExpired()
+
+        settled = now - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+        candidates = []
+        for kind, model in MODELS.items():
+            rows = model.all_objects.filter(user=self.user, updated_at__lte=settled)
+            if kind in positions:
+                ts, pk = positions[kind]
+                rows = rows.filter(Q(updated_at__gt=ts) | Q(updated_at=ts, id__gt=pk))
+            fields = ('id', 'updated_at', 'is_deleted') + self.FIELDS[kind]
+            for row in rows.order_by('updated_at', 'id').values(*fields)[:self.page_size + 1]:
+                candidates.append((row['updated_at'], kind, row))
+
+        candidates.sort(key=lambda item: (item[0], item[1], item[2]['id']))
+        taken = candidates[:self.page_size]
+        changes = []
+        for updated_at, kind, row in taken:
+            positions[kind] = (updated_at, row['id'])
+            change = {'type': kind, 'id': row['id'], 'updated_at': updated_at, 'deleted': row['is_deleted']}
+            if not row['is_deleted']:
+                change['data'] = {field: row[field] for field in self.FIELDS[kind]}
+            changes.append(change)
+
+        has_more = len(candidates) > len(taken)
+        # Mid-run the client is only complete as of the run's first page; a finished run is complete up to settled
+        if not has_more or issued is None:
+            issued = settled
+        return {
+            'changes': changes,
+            'cursor': self.encode_cursor(issued, positions),
+            'has_more': has_more,
+        }
+
+
+def purge_tombstones(older_than=None):
+    """Hard-delete tombstones past the retention window; returns rows removed per type."""
+    older_than = older_than or timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+    return {
+        kind: model.all_objects.filter(is_deleted=True, updated_at__lt=older_than).delete()[0]
+        for kind, model in MODELS.items()
+    }
@@ -0,0 +1,45 @@
+from django import template
+
+from core_app import fragment_cache
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, section, vary):
+        self.nodelist = nodelist
+        self.section = section
+        self.vary = vary
+
+    def render(self, context):
+        request = context.get('request')
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return self.nodelist.render(context)
+        vary = [value.resolve(context) for value in self.vary]
+        return fragment_cache.render_cached(
+            self.section, user.id, vary, lambda: self.nodelist.render(context)
+        )
+
+
+@register.tag('fragment_cache')
+def do_fragment_cache(parser, token):
+    """
+    Cache the enclosed section per user until the data it reads changes:
+
+        {% fragment_cache "monthly_report" calendar_mode selected_monthly_year %}
+            ...
+        {% endfragment_cache %}
+
+    The section name must be one of core_app.fragment_cache.SECTIONS; the
+    remaining arguments are extra values the output depends on.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2 or bits[1][0] not in '"\'' or bits[1][-1] != bits[1][0]:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a quoted section name and optional vary values.")
+    section = bits[1][1:-1]
+    if section not in fragment_cache.SECTIONS:
+        raise template.TemplateSyntaxError(f"Unknown fragment section '{section}'.")
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+    return FragmentCacheNode(nodelist, section, [parser.compile_filter(bit) for bit in bits[2:]])
@@ -1,3 +1,763 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+from unittest import addModuleCleanup, mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.forms import modelform_factory
+from django.db import IntegrityError, connection, connections, transaction
+from django.http import HttpResponse
+from django.template import engines
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core_app import data_version, replica
+from core_app.algorithms.anomaly_detector import AnomalyDetector
+from core_app.algorithms.budget_tracker import BudgetTracker
+from core_app.archive import archive_transactions, rebuild_summaries
+from core_app.bs_calendar import build_calendar
+from core_app.category_cache import categories
+from core_app.currency import load_rates
+from core_app.forms import ExpenseForm
+from core_app.loadtest import CATEGORY_NAME, LoadTest
+from core_app.models import (
+    ArchivedSummary, Category, CategorySpend, CategoryStat, Expense, IdempotencyKey, Income, RecurringRule,
+)
+from core_app.replica import PRIMARY, REPLICA, _read_alias
+from core_app.statements import PROGRESS_FILE, collect_statements, completed_users
+from core_app.sync import BatchError, BatchWriter, ChangeFeed, CursorExpired
+from core_app.views import PDFRenderer
+from core_app.warmup import WarmUpLifespan, warm_up
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def setUpModule():
+    # Test users reuse ids across runs; keep their stamps and fragments out of the real cache directory
+    cache_dir = tempfile.mkdtemp()
+    addModuleCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+    caches = override_settings(CACHES={'default': dict(settings.CACHES['default'], LOCATION=cache_dir)})
+    caches.enable()
+    addModuleCleanup(caches.disable)
+
+
+class TransactionWritePathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', password='secret')
+        cls.other = User.objects.create_user('other', password='secret')
+        cls.category = Category.objects.create(name='Food')
+
+    def setUp(self):
+        # Category commit hooks never fire inside TestCase, so drop whatever an earlier test cached
+        categories.invalidate()
+        self.client.force_login(self.user)
+
+    def submit(self, url, data):
+        """POST ``data`` and return (response, write statements issued before commit hooks ran)."""
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, data)
+        writes = [q['sql'] for q in queries.captured_queries if q['sql'].lstrip().upper().startswith(WRITES)]
+        return response, writes
+
+    def expense_data(self, **overrides):
+        data = {'category': self.category.id, 'amount': 250, 'currency': 'INR',
+                'description': 'Lunch', 'date': date.today().isoformat()}
+        data.update(overrides)
+        return data
+
+    def test_add_expense_is_one_insert(self):
+        response, writes = self.submit(reverse('add_expense'), self.expense_data())
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertEqual(len(writes), 1, writes)
+        self.assertIn('INSERT', writes[0].upper())
+        self.assertEqual(Expense.objects.filter(user=self.user).count(), 1)
+
+    def test_edit_expense_is_one_update(self):
+        expense = Expense.objects.create(user=self.user, category=self.category, amount=100, date=date.today())
+        response, writes = self.submit(reverse('edit_expense', args=[expense.pk]), self.expense_data(amount=300))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(writes), 1, writes)
+        self.assertIn('UPDATE', writes[0].upper())
+        expense.refresh_from_db()
+        self.assertEqual(expense.amount, 300)
+
+    def test_commit_hooks_update_stats_and_counters(self):
+        self.submit(reverse('add_expense'), self.expense_data(amount=250))
+        expense = Expense.objects.get(user=self.user)
+        self.submit(reverse('edit_expense', args=[expense.pk]), self.expense_data(amount=400))
+        stat = CategoryStat.objects.get(user=self.user, category=self.category)
+        self.assertEqual((stat.count, stat.mean), (1, 400))
+        self.assertEqual(CategorySpend.objects.get(user=self.user, category=self.category).spent, 400)
+
+    def test_bulk_counter_updates_are_set_based(self):
+        other_category = Category.objects.create(name='Rent')
+        CategorySpend.objects.create(user=self.user, category=self.category, month=date(2026, 3, 1), spent=100)
+        expenses = [
+            Expense(user=self.user, category=self.category, amount=50, date=date(2026, 3, day)) for day in (2, 9)
+        ] + [
+            Expense(user=self.user, category=other_category, amount=70, date=date(2026, 3, 2)),
+            Expense(user=self.other, category=None, amount=30, date=date(2026, 4, 2)),
+        ]
+        for expense in expenses:
+            expense.base_amount = expense.amount
+        with CaptureQueriesContext(connection) as queries:
+            BudgetTracker.record_many(expenses)
+        statements = [q['sql'].lstrip().split()[0].upper() for q in queries.captured_queries]
+        # One read, then upserts: existing counters conflict on their id, new ones are plain inserts
+        self.assertEqual([s for s in statements if s in ('SELECT',) + WRITES], ['SELECT', 'INSERT', 'INSERT'])
+        spent = {(c.user_id, c.category_id, c.month): c.spent for c in CategorySpend.objects.all()}
+        self.assertEqual(spent, {
+            (self.user.id, self.category.id, date(2026, 3, 1)): 200,
+            (self.user.id, other_category.id, date(2026, 3, 1)): 70,
+            (self.other.id, None, date(2026, 4, 1)): 30,
+        })
+        BudgetTracker.record_many(expenses, sign=-1)
+        self.assertEqual(set(CategorySpend.objects.values_list('spent', flat=True)), {100, 0})
+
+    def test_deleting_a_category_moves_its_stats_to_uncategorised(self):
+        travel = Category.objects.create(name='Travel')
+        for amount, category, day in ((100, travel, 3), (300, travel, 4), (50, None, 4), (80, self.category, 5)):
+            Expense.objects.create(user=self.user, category=category, amount=amount, date=date(2026, 3, day))
+        Expense.objects.create(user=self.user, category=travel, amount=20, date=date(2026, 4, 1))
+        AnomalyDetector.rebuild()
+        BudgetTracker.rebuild()
+
+        def derived():
+            stats = {s.category_id: (s.count, round(s.mean, 6), round(s.m2, 6)) for s in CategoryStat.objects.all()}
+            return stats, sorted(CategorySpend.objects.values_list('category_id', 'month', 'spent'), key=str)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            travel.delete()
+        folded = derived()
+        self.assertEqual(folded[0][None][0], 4)
+        # Same as recounting the expenses, which SET_NULL moved to the uncategorised key
+        AnomalyDetector.rebuild()
+        BudgetTracker.rebuild()
+        self.assertEqual(folded, derived())
+
+    def test_add_and_edit_income_are_one_write_each(self):
+        data = {'amount': 5000, 'currency': 'INR', 'description': 'Salary', 'date': date.today().isoformat()}
+        _, writes = self.submit(reverse('add_income'), data)
+        self.assertEqual(len(writes), 1, writes)
+        income = Income.objects.get(user=self.user)
+        _, writes = self.submit(reverse('edit_income', args=[income.pk]), dict(data, amount=6000))
+        self.assertEqual(len(writes), 1, writes)
+        income.refresh_from_db()
+        self.assertEqual(income.amount, 6000)
+
+    def test_add_pages_render_every_required_field(self):
+        # Post exactly the fields each page renders, so a field missing from a hand-written template fails here
+        values = {'category': self.category.id, 'amount': 250, 'currency': 'INR',
+                  'description': 'From the page', 'date': date.today().isoformat()}
+        for url_name, model in (('add_expense', Expense), ('add_income', Income)):
+            page = self.client.get(reverse(url_name)).content.decode()
+            data = {}
+            for tag in re.findall(r'<(?:input|select|textarea)[^>]*>', page):
+                name = re.search(r'\sname="([^"]+)"', tag).group(1)
+                if 'type="hidden"' in tag:
+                    data[name] = re.search(r'\svalue="([^"]*)"', tag).group(1)  # as a browser would send it
+                else:
+                    data[name] = values[name]
+            data.pop('csrfmiddlewaretoken', None)
+            response, _ = self.submit(reverse(url_name), data)
+            self.assertEqual(response.status_code, 302, f'{url_name} rejected the rendered fields {sorted(data)}')
+            self.assertTrue(model.objects.filter(user=self.user, description='From the page').exists())
+
+    def test_edit_is_scoped_to_owner(self):
+        expense = Expense.objects.create(user=self.other, category=self.category, amount=100, date=date.today())
+        response, writes = self.submit(reverse('edit_expense', args=[expense.pk]), self.expense_data())
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(writes, [])
+        response = self.client.get(reverse('delete_expense', args=[expense.pk]))
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(Expense.objects.filter(pk=expense.pk).exists())
+
+
+class CategoryCacheTests(TestCase):
+    def setUp(self):
+        categories.invalidate()
+        self.food = Category.objects.create(name='Food')
+
+    def test_expense_form_renders_and_validates_from_cache(self):
+        categories.all()  # warm
+        with self.assertNumQueries(0):
+            form = ExpenseForm()
+            rendered = str(form['category'])
+            self.assertEqual(form.fields['category'].clean(str(self.food.id)), self.food)
+        self.assertIn('Food', rendered)
+        self.assertFalse(ExpenseForm(data={'category': 999, 'amount': 10, 'currency': 'INR',
+                                           'date': date.today().isoformat()}).is_valid())
+
+    def test_save_and_delete_invalidate(self):
+        self.assertEqual(categories.name(self.food.id), 'Food')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food.name = 'Groceries'
+            self.food.save()
+        self.assertEqual(categories.name(self.food.id), 'Groceries')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food.delete()
+        self.assertIsNone(categories.get(self.food.id))
+
+    def test_reloads_from_primary_inside_replica_reads(self):
+        token = _read_alias.set(REPLICA)
+        try:
+            with self.assertNumQueries(1, using=PRIMARY):
+                self.assertEqual(categories.name(self.food.id), 'Food')
+        finally:
+            _read_alias.reset(token)
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', password='secret')
+        cls.category = Category.objects.create(name='Food')
+        cls.expense = Expense.objects.create(user=cls.user, category=cls.category, amount=100, date=date.today())
+        cls.income = Income.objects.create(user=cls.user, amount=5000, date=date.today())
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def lookups(self, url, **params):
+        """GET ``url`` and return {section: 'hit'|'miss'} from its Server-Timing header."""
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        result = {}
+        for entry in response.get('Server-Timing', '').split(', '):
+            name, desc = entry.split(';')[:2]
+            result[name.removeprefix('frag-')] = desc.split('"')[1]
+        return result
+
+    def test_dashboard_sections_are_cached_per_data_kind(self):
+        sections = {'budget_overview', 'expense_distribution', 'monthly_trend', 'insights', 'budget_pie'}
+        self.assertEqual(self.lookups(reverse('dashboard')), dict.fromkeys(sections, 'miss'))
+        self.assertEqual(self.lookups(reverse('dashboard')), dict.fromkeys(sections, 'hit'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('edit_income', args=[self.income.pk]), {
+                'amount': 6000, 'currency': 'INR', 'description': '', 'date': date.today().isoformat(),
+            })
+        lookups = self.lookups(reverse('dashboard'))
+        self.assertEqual(lookups.pop('expense_distribution'), 'hit')
+        self.assertEqual(set(lookups.values()), {'miss'})
+
+    def test_version_stamps_reach_other_worker_processes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            data_version.bump(self.user.id)
+        worker = subprocess.run(
+            [sys.executable, '-c', 'import django; django.setup(); from core_app import data_version; '
+                                   f'print(data_version.current({self.user.id}))'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE='Sika_ved.settings',
+                     SIKA_CACHE_DIR=str(settings.CACHES['default']['LOCATION'])),
+        )
+        self.assertEqual(worker.stdout.strip(), data_version.current(self.user.id))
+
+    def test_report_tables_vary_on_their_filters(self):
+        sections = {'weekly_report', 'monthly_report', 'yearly_report', 'category_report'}
+        self.assertEqual(self.lookups(reverse('reports')), dict.fromkeys(sections, 'miss'))
+        month = date.today().strftime('%Y-%m')
+        self.assertEqual(self.lookups(reverse('reports'), weekly_month=month), dict(
+            dict.fromkeys(sections, 'hit'), weekly_report='miss'
+        ))
+
+    def test_category_rename_refreshes_distribution(self):
+        self.client.get(reverse('dashboard'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Groceries'
+            self.category.save()
+        self.assertEqual(self.lookups(reverse('dashboard'))['expense_distribution'], 'miss')
+
+    def test_building_the_calendar_refreshes_bs_reports(self):
+        self.client.get(reverse('reports'), {'calendar': 'bs'})
+        with self.captureOnCommitCallbacks(execute=True):
+            build_calendar(date.today() - timedelta(days=1), date.today())
+        self.assertEqual(set(self.lookups(reverse('reports'), calendar='bs').values()), {'miss'})
+
+
+class PDFRendererLinkTests(TestCase):
+    def test_link_callback_resolves_local_files_only(self):
+        with tempfile.TemporaryDirectory() as assets, tempfile.TemporaryDirectory() as media:
+            open(os.path.join(assets, 'weekly.svg'), 'w').close()
+            open(os.path.join(media, 'logo.png'), 'w').close()
+            renderer = PDFRenderer('reports_pdf.html', asset_dir=assets)
+            with override_settings(MEDIA_ROOT=media, MEDIA_URL='/media/'):
+                self.assertEqual(renderer.link_callback('weekly.svg', None), os.path.join(assets, 'weekly.svg'))
+                self.assertEqual(renderer.link_callback('/media/logo.png', None),
+                                 os.path.join(os.path.realpath(media), 'logo.png'))
+                for uri in ('missing.svg', '../weekly.svg', '/media/../etc/passwd', 'data:image/png;base64,AA'):
+                    self.assertEqual(renderer.link_callback(uri, None), uri)
+
+
+class StatementCollectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.food = Category.objects.create(name='Food')
+        cls.rent = Category.objects.create(name='Rent')
+        cls.users = [User.objects.create_user(f'user{n}') for n in range(3)]
+        for user in cls.users:
+            Expense.objects.create(user=user, category=cls.food, amount=100, date=date(2026, 9, 3))
+            Expense.objects.create(user=user, category=cls.rent, amount=900, date=date(2026, 9, 25))
+            Expense.objects.create(user=user, category=cls.food, amount=50, date=date(2026, 10, 1))
+            Income.objects.create(user=user, amount=5000, date=date(2026, 9, 9))
+        ArchivedSummary.objects.create(user=cls.users[0], kind=ArchivedSummary.EXPENSE, category=cls.food,
+                                       amount=40, date=date(2026, 9, 15), count=2)
+
+    def setUp(self):
+        categories.invalidate()
+        categories.all()
+
+    def test_collects_every_user_with_a_fixed_number_of_queries(self):
+        # live expenses, live incomes, archived summaries, usernames, currencies
+        with self.assertNumQueries(5):
+            statements = collect_statements(date(2026, 9, 1))
+        self.assertEqual([s['username'] for s in statements], ['user0', 'user1', 'user2'])
+        first = statements[0]
+        self.assertEqual((first['total_expense'], first['total_income'], first['balance']), (1040, 5000, 3960))
+        self.assertEqual([w['expenses'] for w in first['weekly_summary']], [100, 0, 40, 900])
+        self.assertEqual(first['expense_category'], [
+            {'category': 'Rent', 'total': 900}, {'category': 'Food', 'total': 140},
+        ])
+
+    def test_checkpoint_skips_missing_files_and_cut_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            open(os.path.join(directory, '1.pdf'), 'w').close()
+            with open(os.path.join(directory, PROGRESS_FILE), 'w') as fh:
+                fh.write('{"user_id": 1, "file": "1.pdf", "bytes": 10}\n')
+                fh.write('{"user_id": 2, "file": "2.pdf", "bytes": 10}\n')
+                fh.write('{"user_id": 3, "fi')
+            self.assertEqual(completed_users(directory), {1})
+
+
+class WarmUpTests(TestCase):
+    def test_steps_compile_templates_and_fill_category_cache(self):
+        categories.invalidate()
+        timings = warm_up(['templates', 'database', 'categories'])
+        self.assertEqual(list(timings), ['templates', 'database', 'categories'])
+        loader = engines['django'].engine.template_loaders[0]
+        self.assertIn('dashboard.html', loader.get_template_cache)
+        with self.assertNumQueries(0):
+            categories.all()
+
+    def test_unknown_step_is_rejected(self):
+        with self.assertRaises(ValueError):
+            warm_up(['templates', 'gpu'])
+
+    def test_lifespan_startup_runs_warm_up(self):
+        messages = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        app = WarmUpLifespan(application=None, steps=['templates', 'database'])
+        async_to_sync(app)({'type': 'lifespan'}, receive, send)
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+
+class BatchWriterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', password='secret')
+        cls.other = User.objects.create_user('other', password='secret')
+        cls.category = Category.objects.create(name='Food')
+
+    def setUp(self):
+        categories.invalidate()
+
+    def apply(self, operations):
+        with self.captureOnCommitCallbacks(execute=True):
+            return BatchWriter(self.user).apply(operations)
+
+    def expense(self, amount, **extra):
+        data = {'category': self.category.id, 'amount': amount, 'date': '2026-03-05'}
+        return dict({'op': 'create', 'type': 'expense', 'data': data}, **extra)
+
+    def counters(self):
+        stat = CategoryStat.objects.get(user=self.user, category=self.category)
+        spent = CategorySpend.objects.get(user=self.user, category=self.category).spent
+        return stat.count, stat.mean, spent
+
+    def test_create_update_and_delete_keep_counters_in_step(self):
+        results = self.apply([self.expense(100), self.expense(50),
+                              {'op': 'create', 'type': 'income', 'data': {'amount': 900, 'date': '2026-03-05'}}])
+        self.assertEqual([r['status'] for r in results], ['created'] * 3)
+        first, second = results[0]['id'], results[1]['id']
+        self.assertEqual(self.counters(), (2, 75, 150))
+
+        results = self.apply([
+            {'op': 'update', 'type': 'expense', 'id': first, 'data': {'amount': 300}},
+            {'op': 'delete', 'type': 'expense', 'id': second},
+        ])
+        self.assertEqual([r['status'] for r in results], ['updated', 'deleted'])
+        self.assertEqual(Expense.objects.get(pk=first).amount, 300)
+        self.assertTrue(Expense.all_objects.get(pk=second).is_deleted)
+        self.assertEqual(self.counters(), (1, 300, 300))
+
+    def test_replayed_keys_return_the_stored_results(self):
+        first = self.apply([self.expense(100, key='a')])
+        again = self.apply([self.expense(100, key='a'), self.expense(20, key='b')])
+        self.assertEqual(again[0], dict(first[0], replayed=True))
+        self.assertEqual(again[1]['status'], 'created')
+        self.assertEqual(Expense.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(self.counters()[::2], (2, 120))
+
+    def test_rejected_batches_write_nothing(self):
+        foreign = Expense.objects.create(user=self.other, category=self.category, amount=5, date=date(2026, 3, 5))
+        own = self.apply([self.expense(100)])[0]['id']
+        before = (list(Expense.all_objects.values_list('id', 'amount', 'is_deleted')), self.counters())
+        batches = [
+            # A valid create next to an operation on someone else's row
+            [self.expense(10, key='c'), {'op': 'delete', 'type': 'expense', 'id': foreign.id}],
+            [self.expense(10), self.expense('lots')],
+            # Two operations on one row would take its old values out of the counters twice
+            [{'op': 'update', 'type': 'expense', 'id': own, 'data': {'amount': 200}},
+             {'op': 'update', 'type': 'expense', 'id': own, 'data': {'amount': 300}}],
+            [{'op': 'update', 'type': 'expense', 'id': own, 'data': {'amount': 200}},
+             {'op': 'delete', 'type': 'expense', 'id': own}],
+        ]
+        for operations in batches:
+            with self.assertRaises(BatchError) as raised:
+                self.apply(operations)
+            self.assertEqual([error['index'] for error in raised.exception.errors], [1])
+        self.assertEqual((list(Expense.all_objects.values_list('id', 'amount', 'is_deleted')), self.counters()),
+                         before)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class LoadTestSetupTests(TestCase):
+    def test_seeded_history_keeps_stats_and_counters_in_step(self):
+        food = Category.objects.create(name='Food')
+        user = LoadTest(users=1, history=30, seed=1).prepare()[0]
+        self.assertEqual(list(Category.objects.values_list('name', flat=True)), ['Food'])
+
+        def derived():
+            stat = CategoryStat.objects.get(user=user, category=food)
+            counters = CategorySpend.objects.filter(user=user).order_by('month').values_list('month', 'spent')
+            return stat.count, round(stat.mean, 6), [(month, round(spent, 6)) for month, spent in counters]
+
+        seeded = derived()
+        self.assertEqual(seeded[0], 30)
+        AnomalyDetector.rebuild(user=user)
+        BudgetTracker.rebuild(user=user)
+        self.assertEqual(seeded, derived())
+
+    def test_fallback_category_is_removed_with_the_users(self):
+        LoadTest(users=2, history=5, seed=1).prepare()
+        self.assertTrue(Category.objects.filter(name=CATEGORY_NAME).exists())
+        LoadTest.cleanup()
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Category.objects.exists())
+
+
+class ChangeFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', password='secret')
+        cls.category = Category.objects.create(name='Food')
+        old = timezone.now() - timedelta(days=200)
+        for n in range(5):
+            Expense.objects.create(user=cls.user, category=cls.category, amount=10 + n, date=date(2026, 1, 1))
+        # update() skips auto_now, so the rows really look last touched 200 days ago
+        for n, expense in enumerate(Expense.objects.order_by('id')):
+            Expense.objects.filter(pk=expense.pk).update(updated_at=old + timedelta(minutes=n))
+
+    def walk(self, feed, cursor=None):
+        """Follow has_more to the end; returns (changes, last cursor)."""
+        changes = []
+        while True:
+            page = feed.page(cursor)
+            changes += page['changes']
+            cursor = page['cursor']
+            if not page['has_more']:
+                return changes, cursor
+
+    def test_full_sync_pages_through_history_older_than_retention(self):
+        changes, cursor = self.walk(ChangeFeed(self.user, page_size=2))
+        self.assertEqual([c['data']['amount'] for c in changes], [10, 11, 12, 13, 14])
+        self.assertEqual(ChangeFeed(self.user, page_size=2).page(cursor)['changes'], [])
+
+    def test_deletes_arrive_as_tombstones(self):
+        _, cursor = self.walk(ChangeFeed(self.user))
+        expense = Expense.objects.order_by('id').first()
+        Expense.objects.filter(pk=expense.pk).soft_delete()
+        Expense.all_objects.filter(pk=expense.pk).update(updated_at=timezone.now() - timedelta(minutes=1))
+        changes = ChangeFeed(self.user).page(cursor)['changes']
+        self.assertEqual([(c['id'], c['deleted'], 'data' in c) for c in changes], [(expense.pk, True, False)])
+
+    def test_cursor_expires_by_issue_time_not_row_age(self):
+        now = timezone.now()
+        position = {'expense': (now - timedelta(days=300), 0)}
+        fresh = ChangeFeed.encode_cursor(now - timedelta(days=1), position)
+        self.assertEqual(len(ChangeFeed(self.user).page(fresh)['changes']), 5)
+        stale = ChangeFeed.encode_cursor(now - timedelta(days=settings.SYNC_TOMBSTONE_DAYS + 1), position)
+        with self.assertRaises(CursorExpired):
+            ChangeFeed(self.user).page(stale)
+
+    def test_cursors_with_naive_times_are_rejected(self):
+        self.client.force_login(self.user)
+        legacy = {'expense': ['2026-01-01T00:00:00', 1]}
+        for raw in ({'issued': '2026-01-01T00:00:00', 'positions': {}}, legacy):
+            cursor = base64.urlsafe_b64encode(json.dumps(raw).encode()).decode()
+            with self.assertRaises(ValueError):
+                ChangeFeed.decode_cursor(cursor)
+            self.assertEqual(self.client.get(reverse('changes'), {'since': cursor}).status_code, 400)
+
+    def test_cursor_keeps_run_start_until_caught_up(self):
+        first = ChangeFeed(self.user, page_size=2).page()
+        second = ChangeFeed(self.user, page_size=2).page(first['cursor'])
+        issued = ChangeFeed.decode_cursor(first['cursor'])[0]
+        self.assertTrue(second['has_more'])
+        self.assertEqual(ChangeFeed.decode_cursor(second['cursor'])[0], issued)
+
+    def test_rows_inside_settle_window_wait_for_the_next_call(self):
+        _, cursor = self.walk(ChangeFeed(self.user))
+        expense = Expense.objects.order_by('id').first()
+        expense.amount = 99
+        expense.save()
+        self.assertEqual(ChangeFeed(self.user).page(cursor)['changes'], [])
+        Expense.objects.filter(pk=expense.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=settings.SYNC_SETTLE_SECONDS + 1))
+        self.assertEqual([c['data']['amount'] for c in ChangeFeed(self.user).page(cursor)['changes']], [99])
+
+
+class MaterializeRecurringTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', password='secret')
+        cls.category = Category.objects.create(name='Rent')
+        # Month-end anchor: later occurrences clamp to the last day of shorter months
+        cls.rule = RecurringRule.objects.create(user=cls.user, category=cls.category, amount=100,
+                                                start_date=date(2026, 1, 31))
+        cls.salary = RecurringRule.objects.create(user=cls.user, kind=RecurringRule.INCOME, amount=5000,
+                                                  start_date=date(2026, 1, 1))
+        # Counted before the rules ran, so the bulk writes must add to these rows
+        CategoryStat.objects.create(user=cls.user, category=cls.category, count=1, mean=100)
+        CategorySpend.objects.create(user=cls.user, category=cls.category, month=date(2026, 1, 1), spent=40)
+
+    def materialize(self, until, batch_size=5000):
+        out = StringIO()
+        call_command('materialize_recurring', '--until', until, '--batch-size', str(batch_size), stdout=out)
+        return out.getvalue()
+
+    def test_zero_interval_is_rejected_outside_the_app_form(self):
+        # The admin builds a plain ModelForm; a 0 interval would never advance next_run
+        form_class = modelform_factory(RecurringRule, fields=['kind', 'amount', 'frequency', 'interval', 'start_date'])
+        form = form_class({'kind': 'expense', 'amount': 10, 'frequency': 'monthly', 'interval': 0,
+                           'start_date': '2026-01-01'})
+        self.assertEqual(form.errors['interval'], ['Interval must be at least 1.'])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            RecurringRule.objects.filter(pk=self.rule.pk).update(interval=0)
+
+    def test_catches_up_every_missed_occurrence(self):
+        self.assertIn('created 6 transactions', self.materialize('2026-03-31', batch_size=1))
+        self.assertEqual(list(Expense.objects.order_by('date').values_list('date', flat=True)),
+                         [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31)])
+        self.assertEqual(Income.objects.count(), 3)
+        self.rule.refresh_from_db()
+        self.assertEqual(self.rule.next_run, date(2026, 4, 30))
+        self.assertEqual(CategoryStat.objects.get(user=self.user, category=self.category).count, 4)
+        self.assertEqual(dict(CategorySpend.objects.values_list('month', 'spent')),
+                         {date(2026, 1, 1): 140, date(2026, 2, 1): 100, date(2026, 3, 1): 100})
+
+    def test_reruns_write_nothing_twice(self):
+        self.materialize('2026-03-31')
+        counters = list(CategorySpend.objects.values_list('month', 'spent'))
+        self.assertIn('created 0 transactions', self.materialize('2026-03-31'))
+        # An interrupted run leaves rows its rule never advanced past; a deleted occurrence stays deleted
+        Expense.objects.filter(date=date(2026, 3, 31)).soft_delete()
+        RecurringRule.objects.filter(pk=self.rule.pk).update(next_run=date(2026, 2, 28))
+        self.assertIn('created 2 transactions', self.materialize('2026-04-30'))
+        self.assertEqual((Expense.all_objects.count(), Income.objects.count()), (4, 4))
+        self.assertEqual(list(Expense.objects.order_by('date').values_list('date', flat=True)),
+                         [date(2026, 1, 31), date(2026, 2, 28), date(2026, 4, 30)])
+        self.assertEqual(CategoryStat.objects.get(user=self.user, category=self.category).count, 5)
+        self.assertEqual(sorted(CategorySpend.objects.values_list('month', 'spent')),
+                         sorted(counters) + [(date(2026, 4, 1), 100)])
+
+
+class ArchiveReportTests(TestCase):
+    # Baisakh 1 2081 and Shrawan 1 2081 (start of FY 2081/82) both fall mid-week
+    DAYS = [date(2024, 4, 9), date(2024, 4, 13), date(2024, 7, 15), date(2024, 7, 17), date(2024, 7, 30)]
+    SECTIONS = ('weekly_summary', 'monthly_summary', 'yearly_summary', 'expense_category')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', password='secret')
+        cls.category = Category.objects.create(name='Food')
+        for n, day in enumerate(cls.DAYS):
+            Expense.objects.create(user=cls.user, category=cls.category, amount=100 * (n + 1), date=day)
+            Income.objects.create(user=cls.user, amount=1000 * (n + 1), date=day)
+
+    def setUp(self):
+        categories.invalidate()
+        self.client.force_login(self.user)
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+
+    def reports(self):
+        """Every report section in AD and BS mode, for all months and for April/July 2024."""
+        result = {}
+        for params in ({}, {'calendar': 'bs'}, {'weekly_month': '2024-04'}, {'weekly_month': '2024-07'},
+                       {'calendar': 'bs', 'monthly_year': '2081'}, {'category_month': '2024-07'}):
+            cache.clear()
+            context = self.client.get(reverse('reports'), params).context
+            for section in self.SECTIONS:
+                result[(tuple(params.items()), section)] = list(context[section])
+        return result
+
+    def archive(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_transactions(date(2025, 1, 1))
+        self.assertFalse(Expense.objects.exists())
+
+    def test_deleted_category_totals_are_counted_once(self):
+        user = User.objects.create_user('second', password='secret')
+        snacks = Category.objects.create(name='Snacks')
+        Expense.objects.create(user=user, category=snacks, amount=10, date=date(2024, 5, 1))
+        Expense.objects.create(user=user, amount=20, date=date(2024, 5, 1))
+        self.archive()
+        snacks.delete()  # its summary becomes a second uncategorised row for the bucket
+        Expense.objects.create(user=user, amount=5, date=date(2024, 5, 1))
+        self.archive()
+        totals = ArchivedSummary.objects.filter(user=user, kind=ArchivedSummary.EXPENSE).values_list('amount', 'count')
+        self.assertEqual((sum(amount for amount, _ in totals), sum(count for _, count in totals)), (35, 3))
+
+    def test_reports_are_unchanged_by_archiving(self):
+        build_calendar(date(2024, 1, 1), date(2024, 12, 31))
+        before = self.reports()
+        self.archive()
+        self.assertEqual(self.reports(), before)
+
+    def test_rebuild_moves_totals_archived_before_the_calendar(self):
+        self.archive()
+        build_calendar(date(2024, 1, 1), date(2024, 12, 31))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(rebuild_summaries(), {'expense': 5, 'income': 5})
+        archived = self.reports()
+        # Same data live: restore the rows and drop the summaries
+        ArchivedSummary.objects.all().delete()
+        for n, day in enumerate(self.DAYS):
+            Expense.objects.create(user=self.user, category=self.category, amount=100 * (n + 1), date=day)
+            Income.objects.create(user=self.user, amount=1000 * (n + 1), date=day)
+        self.assertEqual(archived, self.reports())
+
+
+@mock.patch.object(replica, 'replica_configured', return_value=True)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.router = replica.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def routed_reads(self, request):
+        """Aliases chosen for an app model and an auth model inside a read_from_replica view."""
+        @replica.read_from_replica
+        def view(request):
+            return {'expense': self.router.db_for_read(Expense), 'user': self.router.db_for_read(User)}
+        return view(request)
+
+    def test_reads_use_replica_only_inside_decorated_views(self, configured):
+        request = self.factory.get('/')
+        request.pin_primary = False
+        self.assertEqual(self.routed_reads(request), {'expense': REPLICA, 'user': PRIMARY})
+        self.assertEqual(self.router.db_for_read(Expense), PRIMARY)
+        self.assertEqual(self.router.db_for_write(Expense), PRIMARY)
+
+    def test_pinned_or_unconfigured_requests_read_primary(self, configured):
+        request = self.factory.get('/')
+        request.pin_primary = True
+        self.assertEqual(self.routed_reads(request), {'expense': PRIMARY, 'user': PRIMARY})
+        configured.return_value = False
+        request.pin_primary = False
+        self.assertEqual(self.routed_reads(request), {'expense': PRIMARY, 'user': PRIMARY})
+
+    def test_middleware_pins_after_a_write_and_clears_afterwards(self, configured):
+        def write(request):
+            Category.objects.create(name='Pinned')
+            return HttpResponse()
+
+        response = replica.ReplicaPinMiddleware(write)(self.factory.post('/'))
+        self.assertEqual(response.cookies[replica.PIN_COOKIE].value, '1')
+
+        request = self.factory.get('/')
+        request.COOKIES[replica.PIN_COOKIE] = '1'
+        response = replica.ReplicaPinMiddleware(lambda request: HttpResponse())(request)
+        self.assertTrue(request.pin_primary)
+        self.assertEqual(response.cookies[replica.PIN_COOKIE]['max-age'], 0)
+
+        response = replica.ReplicaPinMiddleware(lambda request: HttpResponse())(self.factory.get('/'))
+        self.assertNotIn(replica.PIN_COOKIE, response.cookies)
+
+
+@skipUnless(replica.replica_configured(), 'set SIKA_REPLICA_DB to run against a second SQLite file')
+class ReplicaDatabaseTests(TransactionTestCase):
+    """
+    End to end against a mirrored second SQLite file; the other view tests assume no replica, so run alone:
+    SIKA_REPLICA_DB=/tmp/replica.sqlite3 python manage.py test core_app.tests.ReplicaDatabaseTests
+    """
+    # Committed rows only: the mirrored replica is a second connection to the test database.
+    # The runner sets up the databases of skipped classes too, so only ask for the replica when it exists
+    databases = {PRIMARY, REPLICA} if replica.replica_configured() else {PRIMARY}
+
+    def test_decorated_views_aggregate_on_the_replica(self):
+        user = User.objects.create_user('owner', password='secret')
+        category = Category.objects.create(name='Food')
+        Expense.objects.create(user=user, category=category, amount=100, date=date.today())
+        Income.objects.create(user=user, amount=1000, date=date.today())
+        self.client.force_login(user)
+        for url_name in ('dashboard', 'reports'):
+            cache.clear()  # cached sections would skip the aggregations
+            with CaptureQueriesContext(connections[PRIMARY]) as primary_queries, \
+                    CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+                self.assertEqual(self.client.get(reverse(url_name)).status_code, 200)
+            # Template responses render lazily; their summaries must still read the replica
+            aggregations = [q['sql'] for q in replica_queries.captured_queries if 'SUM(' in q['sql'].upper()]
+            self.assertTrue(aggregations, url_name)
+            # Only the shared category cache loads from the primary (core_app.category_cache)
+            on_primary = [q['sql'] for q in primary_queries.captured_queries
+                          if 'core_app_' in q['sql'] and q['sql'].lstrip().upper().startswith('SELECT')
+                          and not q['sql'].startswith('SELECT "core_app_category"')]
+            self.assertEqual(on_primary, [], url_name)
+
+
+class RateImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', password='secret')
+        cls.other = User.objects.create_user('other', password='secret')
+        cls.category = Category.objects.create(name='Travel')
+        Expense.objects.create(user=cls.user, category=cls.category, amount=10, currency='USD', date=date(2026, 3, 5))
+        Expense.objects.create(user=cls.other, category=cls.category, amount=500, date=date(2026, 3, 5))
+        # Built before any USD rate exists, i.e. at 1:1
+        AnomalyDetector.rebuild()
+        BudgetTracker.rebuild()
+
+    def test_import_rebuilds_counters_of_users_holding_the_currency(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as fh:
+            fh.write('date,currency,rate\n2026-03-01,USD,130\n')
+        self.addCleanup(os.remove, fh.name)
+        untouched = CategoryStat.objects.get(user=self.other).pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(load_rates(fh.name), 1)
+        self.assertEqual(CategoryStat.objects.get(user=self.user).mean, 1300)
+        self.assertEqual(CategorySpend.objects.get(user=self.user).spent, 1300)
+        self.assertEqual(CategoryStat.objects.get(user=self.other).pk, untouched)
@@ -1,14 +1,19 @@
 from django.urls import path
 from .views import (
-    DashboardView,
+    DashboardView, DashboardChartDataView,
     ExpenseCreateView, ExpenseUpdateView, ExpenseDeleteView,
     IncomeCreateView, IncomeUpdateView, IncomeDeleteView,
+    RecurringRuleCreateView, RecurringRuleDeleteView,
+    CategoryBudgetCreateView, CategoryBudgetDeleteView,
+    CurrencyPreferenceView,
+    TransactionBatchView, ChangesView,
     ReportsView, ReportsPDFView
 )
 
 urlpatterns = [
     # Dashboard
     path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('dashboard/charts/', DashboardChartDataView.as_view(), name='dashboard_chart_data'),
 
     # Expense routes
     path('expense/add/', ExpenseCreateView.as_view(), name='add_expense'),
@@ -20,6 +25,21 @@ urlpatterns = [
     path('income/edit/<int:pk>/', IncomeUpdateView.as_view(), name='edit_income'),
     path('income/delete/<int:pk>/', IncomeDeleteView.as_view(), name='delete_income'),
 
+    # Recurring transactions
+    path('recurring/', RecurringRuleCreateView.as_view(), name='recurring_rules'),
+    path('recurring/delete/<int:pk>/', RecurringRuleDeleteView.as_view(), name='delete_recurring_rule'),
+
+    # Category budgets
+    path('budgets/', CategoryBudgetCreateView.as_view(), name='category_budgets'),
+    path('budgets/delete/<int:pk>/', CategoryBudgetDeleteView.as_view(), name='delete_category_budget'),
+
+    # Base currency
+    path('currency/', CurrencyPreferenceView.as_view(), name='currency_preference'),
+
+    # Client sync API
+    path('api/transactions/batch/', TransactionBatchView.as_view(), name='transaction_batch'),
+    path('api/changes/', ChangesView.as_view(), name='changes'),
+
     # Reports
     path('reports/', ReportsView.as_view(), name='reports'),
     path('reports/pdf/', ReportsPDFView.as_view(), name='reports_pdf'),
@@ -3,30 +3,106 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import io
 import base64
+import dataclasses
+import importlib.util
 import json
+import os
+import tempfile
+from pathlib import Path
 from datetime import date
 from django.shortcuts import redirect
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
 from django.views import View
 from django.views.generic import TemplateView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import F, Sum
 from django.db.models.functions import TruncWeek, TruncMonth, TruncYear
-from django.http import HttpResponse
+from django.db import IntegrityError
+from django.http import HttpResponse, JsonResponse
 from django.template.loader import get_template
 from django.utils import timezone
-from .models import Expense, Income
-from .forms import ExpenseForm, IncomeForm
+from django.utils.functional import SimpleLazyObject
+from django.utils.text import slugify
+from .models import ArchivedSummary, CategoryBudget, CurrencyPreference, Expense, Income, RecurringRule
+from .forms import CategoryBudgetForm, CurrencyPreferenceForm, ExpenseForm, IncomeForm, RecurringRuleForm
 import calendar
+from collections import defaultdict
+from itertools import chain
 from django.core.serializers.json import DjangoJSONEncoder
 from core_app.algorithms.budget_balancer import BudgetBalancer
+from core_app.algorithms.anomaly_detector import AnomalyDetector
+from core_app.algorithms.budget_tracker import BudgetTracker
+from core_app.category_cache import categories
+from core_app.bs_calendar import bs_month_label, fiscal_year_label
+from core_app.currency import (
+    attach_base_amounts, base_currency, currency_symbol, in_base_currency,
+)
+from core_app import data_version
+from core_app.context_processors import currency as currency_context
+from core_app.replica import read_from_replica
+from core_app.sync import BatchError, BatchWriter, ChangeFeed, CursorExpired
 
 # ================= PDF RENDERER =================
 class PDFRenderer:
-    def __init__(self, template_src, context_dict=None, filename="report.pdf"):
+    def __init__(self, template_src, context_dict=None, filename="report.pdf", asset_dir=None):
+        """
+        :param asset_dir: directory holding files (e.g. charts) that the
+            template references by bare file name
+        """
         self.template_src = template_src
         self.context_dict = context_dict or {}
         self.filename = filename
+        self.asset_dir = asset_dir
+
+    @staticmethod
+    def available():
+        return importlib.util.find_spec('xhtml2pdf') is not None
+
+    def link_callback(self, uri, rel):
+        """
+        Resolve the template's image and stylesheet URIs to local paths so
+        xhtml2pdf reads them straight from disk: bare names from
+        ``asset_dir``, then MEDIA_URL and STATIC_URL paths. Anything else
+        (data URIs, remote URLs) is passed through unchanged.
+        """
+        if self.asset_dir and '/' not in uri and ':' not in uri:
+            path = os.path.join(self.asset_dir, uri)
+            if os.path.isfile(path):
+                return path
+        if uri.startswith(settings.MEDIA_URL):
+            root = os.path.realpath(settings.MEDIA_ROOT)
+            path = os.path.realpath(os.path.join(root, uri[len(settings.MEDIA_URL):]))
+            if path.startswith(root + os.sep) and os.path.isfile(path):
+                return path
+        if uri.startswith(settings.STATIC_URL):
+            path = finders.find(uri[len(settings.STATIC_URL):])
+            if path:
+                return path
+        return uri
+
+    def resource_policy(self):
+        """
+        Recent xhtml2pdf releases only read local files under the working
+        directory; let them read the paths ``link_callback`` resolves to.
+        Returns None on releases without resource policies.
+        """
+        try:
+            from xhtml2pdf.config.resources import default_policy
+        except ImportError:
+            return None
+        roots = [self.asset_dir, settings.MEDIA_ROOT, getattr(settings, 'STATIC_ROOT', None)]
+        return dataclasses.replace(
+            default_policy(settings.BASE_DIR),
+            extra_roots=tuple(Path(root) for root in roots if root),
+        )
 
     def render(self):
         template = get_template(self.template_src)
@@ -45,9 +121,24 @@ class PDFRenderer:
             )
             return HttpResponse(hint + html, content_type='text/html')
 
+        try:
+            from svglib.fonts import register_font
+        except ImportError:
+            pass
+        else:
+            # Chart SVGs ask for matplotlib's DejaVu Sans first; mapped to the PDF's
+            # own Helvetica, svglib no longer probes the system for every family
+            # in the list on every text element
+            register_font('DejaVu Sans', rlgFontName='Helvetica')
+            register_font('DejaVu Sans', weight='bold', rlgFontName='Helvetica-Bold')
+
         response = HttpResponse(content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="{self.filename}"'
-        pisa_status = pisa.CreatePDF(html, dest=response)
+        options = {'link_callback': self.link_callback}
+        policy = self.resource_policy()
+        if policy is not None:
+            options['resource_policy'] = policy
+        pisa_status = pisa.CreatePDF(html, dest=response, **options)
         if pisa_status.err:
             return HttpResponse('Error generating PDF <pre>' + html + '</pre>')
         return response
@@ -55,12 +146,19 @@ class PDFRenderer:
 
 # ================= CHART GENERATOR =================
 class ChartGenerator:
-    def __init__(self, title='Chart', kind='bar', figsize=(6, 4)):
+    FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+    def __init__(self, title='Chart', kind='bar', figsize=(6, 4), fmt='png'):
         self.title = title
         self.kind = kind
         self.figsize = figsize
+        self.fmt = fmt
 
-    def plot(self, labels, datasets):
+    def plot(self, labels, datasets, directory=None):
+        """
+        Draw the chart and return a data URI, or, when ``directory`` is given,
+        write it there and return the file name for PDFRenderer to link.
+        """
         fig, ax = plt.subplots(figsize=self.figsize)
 
         if self.kind == 'bar':
@@ -85,12 +183,20 @@ class ChartGenerator:
         ax.legend()
         plt.tight_layout()
 
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight')
+        # SVG text stays text rather than one path per glyph: a third of the size
+        with plt.rc_context({'svg.fonttype': 'none'}):
+            if directory is not None:
+                name = f"{slugify(self.title) or 'chart'}.{self.fmt}"
+                fig.savefig(os.path.join(directory, name), format=self.fmt, bbox_inches='tight')
+                plt.close(fig)
+                return name
+
+            buf = io.BytesIO()
+            fig.savefig(buf, format=self.fmt, bbox_inches='tight')
         plt.close(fig)
         buf.seek(0)
         img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-        return f"data:image/png;base64,{img_base64}"
+        return f"data:{self.FORMATS[self.fmt]};base64,{img_base64}"
 
 
 # ================= UTILITIES =================
@@ -122,7 +228,8 @@ class ReportsHelper:
     def combine_summary(exp_qs, inc_qs, trunc_func=None, period_type='week'):
         """
         Combine expenses & incomes by fixed weeks (1–7, 8–14, 15–21, 22–end of month)
-        If period_type != 'week', fallback to normal month/year summary
+        If period_type != 'week', fallback to normal month/year summary.
+        Querysets must come through in_base_currency() so totals are in the user's base currency.
         """
         combined = []
 
@@ -141,8 +248,8 @@ class ReportsHelper:
                 week_ranges = [(1,7),(8,14),(15,21),(22,31)]
 
                 for w_label, (start_day, end_day) in zip(weeks, week_ranges):
-                    week_expense = month_exp.filter(date__day__gte=start_day, date__day__lte=end_day).aggregate(Sum('amount'))['amount__sum'] or 0
-                    week_income = month_inc.filter(date__day__gte=start_day, date__day__lte=end_day).aggregate(Sum('amount'))['amount__sum'] or 0
+                    week_expense = month_exp.filter(date__day__gte=start_day, date__day__lte=end_day).aggregate(total=Sum('base_amount'))['total'] or 0
+                    week_income = month_inc.filter(date__day__gte=start_day, date__day__lte=end_day).aggregate(total=Sum('base_amount'))['total'] or 0
 
                     # Only add if there is data
                     if week_expense or week_income:
@@ -156,13 +263,13 @@ class ReportsHelper:
             expense_summary = (
                 exp_qs.annotate(period=trunc_func('date'))
                       .values('period')
-                      .annotate(total=Sum('amount'))
+                      .annotate(total=Sum('base_amount'))
                       .order_by('period')
             )
             income_summary = (
                 inc_qs.annotate(period=trunc_func('date'))
                       .values('period')
-                      .annotate(total=Sum('amount'))
+                      .annotate(total=Sum('base_amount'))
                       .order_by('period')
             )
             periods = sorted(set([e['period'] for e in expense_summary] +
@@ -183,6 +290,73 @@ class ReportsHelper:
 
         return combined
 
+    @staticmethod
+    def combine_bs_summary(exp_qs, inc_qs, period_type='month'):
+        """
+        Combine expenses & incomes by Bikram Sambat month or Nepali fiscal year.
+        Grouping happens in SQL through the CalendarDay join; rows whose date is
+        missing from the calendar table are reported under 'Unmapped'.
+        """
+        if period_type == 'month':
+            keys = ('calendar__bs_year', 'calendar__bs_month')
+        else:
+            keys = ('calendar__fiscal_year',)
+
+        def totals(qs):
+            rows = qs.values(*keys).annotate(total=Sum('base_amount')).order_by()
+            return {tuple(r[k] for k in keys): r['total'] for r in rows}
+
+        expense_totals = totals(exp_qs)
+        income_totals = totals(inc_qs)
+        periods = sorted(set(expense_totals) | set(income_totals),
+                         key=lambda key: tuple(-1 if v is None else v for v in key))
+
+        combined = []
+        for key in periods:
+            if period_type == 'month':
+                label = bs_month_label(*key)
+            else:
+                label = fiscal_year_label(*key)
+            combined.append({
+                'period': label,
+                'expenses': expense_totals.get(key, 0),
+                'incomes': income_totals.get(key, 0),
+            })
+        return combined
+
+    @staticmethod
+    def summarize(sources, combine, *args):
+        """
+        Run ``combine`` over each (expenses, incomes) source and sum rows that
+        share a period. Archived sources come first and hold only older
+        months, so the merged list stays in period order.
+        """
+        merged = {}
+        for exp_qs, inc_qs in sources:
+            for row in combine(exp_qs, inc_qs, *args):
+                if row['period'] in merged:
+                    merged[row['period']]['expenses'] += row['expenses']
+                    merged[row['period']]['incomes'] += row['incomes']
+                else:
+                    merged[row['period']] = dict(row)
+        return list(merged.values())
+
+    @staticmethod
+    def category_totals(expense_querysets):
+        """Expense totals per category name across live and archived rows, largest first."""
+        totals = defaultdict(float)
+        for exp_qs in expense_querysets:
+            for row in exp_qs.values('category_id').annotate(total=Sum('base_amount')).order_by():
+                totals[categories.name(row['category_id'], None)] += row['total']
+        return sorted(
+            ({'category__name': name, 'total': total} for name, total in totals.items()),
+            key=lambda row: row['total'], reverse=True,
+        )
+
+
+def filter_sources(sources, **lookups):
+    return [(exp_qs.filter(**lookups), inc_qs.filter(**lookups)) for exp_qs, inc_qs in sources]
+
 # ================= DASHBOARD =================
 
 
@@ -190,6 +364,51 @@ class ReportsHelper:
 from datetime import datetime
 
 
+def monthly_totals(rows):
+    """Sum {'year', 'month', 'total'} rows that fall in the same month, in month order."""
+    totals = defaultdict(float)
+    for row in rows:
+        totals[(row['year'], row['month'])] += row['total']
+    return [
+        {'year': year, 'month': month, 'total': total}
+        for (year, month), total in sorted(totals.items(), key=lambda item: tuple(-1 if v is None else v for v in item[0]))
+    ]
+
+
+def chart_data(user, calendar_mode='ad'):
+    """
+    Monthly expense/income totals for the dashboard charts, as parallel arrays. Months are integer keys (year * 100 + month), in
+    Gregorian or Bikram Sambat months.
+    """
+    if calendar_mode == 'bs':
+        month_keys = {'year': F('calendar__bs_year'), 'month': F('calendar__bs_month')}
+    else:
+        month_keys = {'year': F('date__year'), 'month': F('date__month')}
+    archived = in_base_currency(ArchivedSummary.objects.filter(user=user))
+    sources = {
+        'expense': (archived.filter(kind=ArchivedSummary.EXPENSE), in_base_currency(Expense.objects.filter(user=user))),
+        'income': (archived.filter(kind=ArchivedSummary.INCOME), in_base_currency(Income.objects.filter(user=user))),
+    }
+    monthly = {}
+    for kind, querysets in sources.items():
+        monthly[kind] = {
+            # Rows outside the calendar table have no BS month; they are left off the chart
+            row['year'] * 100 + row['month']: row['total']
+            for row in monthly_totals(chain.from_iterable(
+                qs.values(**month_keys).annotate(total=Sum('base_amount')).order_by() for qs in querysets
+            ))
+            if row['month'] is not None
+        }
+    months = sorted(set(monthly['expense']) | set(monthly['income']))
+    return {
+        'calendar': calendar_mode,
+        'months': months,
+        'expense': [round(monthly['expense'].get(month, 0), 2) for month in months],
+        'income': [round(monthly['income'].get(month, 0), 2) for month in months],
+    }
+
+
+@method_decorator(read_from_replica, name='dispatch')
 class DashboardView(LoginRequiredMixin, TemplateView):
     template_name = 'dashboard.html'
 
@@ -199,51 +418,51 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         today = datetime.today()
 
         # ✅ All data for the user
-        expenses = Expense.objects.filter(user=user).order_by('-date')
-        incomes = Income.objects.filter(user=user).order_by('-date')
+        expenses = in_base_currency(Expense.objects.filter(user=user)).order_by('-date')
+        incomes = in_base_currency(Income.objects.filter(user=user)).order_by('-date')
 
         # ✅ Monthly totals (for display)
         current_month = today.month
         current_year = today.year
         expense_total = expenses.filter(
             date__month=current_month, date__year=current_year
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        ).aggregate(total=Sum('base_amount'))['total'] or 0
         income_total = incomes.filter(
             date__month=current_month, date__year=current_year
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        ).aggregate(total=Sum('base_amount'))['total'] or 0
+
+        # ✅ Totals of transactions moved to cold storage
+        archived = in_base_currency(ArchivedSummary.objects.filter(user=user))
+        archived_expenses = archived.filter(kind=ArchivedSummary.EXPENSE)
+        archived_incomes = archived.filter(kind=ArchivedSummary.INCOME)
 
         # ✅ All-time totals
-        total_expense_all = expenses.aggregate(total=Sum('amount'))['total'] or 0
-        total_income_all = incomes.aggregate(total=Sum('amount'))['total'] or 0
+        total_expense_all = (
+            (expenses.aggregate(total=Sum('base_amount'))['total'] or 0)
+            + (archived_expenses.aggregate(total=Sum('base_amount'))['total'] or 0)
+        )
+        total_income_all = (
+            (incomes.aggregate(total=Sum('base_amount'))['total'] or 0)
+            + (archived_incomes.aggregate(total=Sum('base_amount'))['total'] or 0)
+        )
 
         # ✅ Net balance across all time
         net_balance = total_income_all - total_expense_all
 
-        # ✅ Monthly summaries for charts
-        expense_monthly = (
-            expenses.values('date__year', 'date__month')
-            .annotate(total=Sum('amount'))
-            .order_by('date__year', 'date__month')
-        )
-        income_monthly = (
-            incomes.values('date__year', 'date__month')
-            .annotate(total=Sum('amount'))
-            .order_by('date__year', 'date__month')
+        # ✅ Monthly charts load separately from DashboardChartDataView
+        calendar_mode = self.request.GET.get('calendar', 'ad')
+
+        # ✅ Integrate Budget Balancer Algorithm for detailed analysis.
+        # Only evaluated when one of its fragments misses the cache.
+        budget_analysis = SimpleLazyObject(
+            lambda: self.analyze_budget(user, incomes, expenses, archived_incomes, archived_expenses)
         )
 
-        # ✅ Integrate Budget Balancer Algorithm for detailed analysis
-        try:
-            # Pass full Income and Expense objects, not just amounts
-            balancer = BudgetBalancer(incomes, expenses)
-            budget_analysis = balancer.analyze()
-        except Exception as e:
-            # Fallback in case algorithm has an issue
-            budget_analysis = {
-                'budget_status': {},
-                'expense_distribution': [],
-                'monthly_trend': [],
-                'insights': [f"Error: {str(e)}"]
-            }
+        # ✅ Expenses flagged as unusual when they were saved
+        anomalies = expenses.filter(is_anomaly=True).select_related('category')[:10]
+
+        # ✅ Category budget limits for the current month
+        budget_limits = BudgetTracker(user).status(today.date())
 
         # ✅ Update context
         context.update({
@@ -254,27 +473,130 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             'total_expense_all': total_expense_all,
             'total_income_all': total_income_all,
             'net_balance': net_balance,
-            'expense_monthly': expense_monthly,
-            'income_monthly': income_monthly,
             'budget_analysis': budget_analysis,  # ✅ Detailed analysis added
+            'anomalies': anomalies,
+            'calendar_mode': calendar_mode,
+            'budget_limits': budget_limits,
         })
 
         return context
 
+    @staticmethod
+    def analyze_budget(user, incomes, expenses, archived_incomes, archived_expenses):
+        try:
+            # Stream (amount, date[, category]) tuples instead of model objects;
+            # archived summaries share their amount/date/category fields.
+            # base_amount is converted to the user's currency in SQL.
+            balancer = BudgetBalancer.from_rows(
+                chain.from_iterable(
+                    source.order_by().values_list('base_amount', 'date').iterator()
+                    for source in (archived_incomes, incomes)
+                ),
+                chain.from_iterable(
+                    source.order_by().values_list('base_amount', 'date', 'category_id').iterator()
+                    for source in (archived_expenses, expenses)
+                ),
+                currency_symbol=currency_symbol(base_currency(user)),
+            )
+            return balancer.analyze()
+        except Exception as e:
+            # Fallback in case algorithm has an issue
+            return {
+                'budget_status': {},
+                'expense_distribution': [],
+                'monthly_trend': [],
+                'insights': [f"Error: {str(e)}"]
+            }
 
-# ================= EXPENSE CBVs =================
-class ExpenseBaseMixin(LoginRequiredMixin):
-    model = Expense
-    form_class = ExpenseForm
+
+def chart_etag(request, *args, **kwargs):
+    calendar_mode = 'bs' if request.GET.get('calendar') == 'bs' else 'ad'
+    return f"{data_version.current(request.user.id)}-{calendar_mode}"
+
+
+@method_decorator(cache_control(private=True, max_age=0, must_revalidate=True), name='dispatch')
+@method_decorator(vary_on_cookie, name='dispatch')
+class DashboardChartDataView(LoginRequiredMixin, View):
+    """
+    Columnar JSON behind the dashboard charts, loaded after the page itself.
+    The ETag follows the user's data version, so an unchanged dashboard is
+    revalidated with a 304 and no queries.
+    """
+    login_url = '/login/'
+
+    @method_decorator(condition(etag_func=chart_etag))
+    def get(self, request, *args, **kwargs):
+        calendar_mode = 'bs' if request.GET.get('calendar') == 'bs' else 'ad'
+        return JsonResponse(chart_data(request.user, calendar_mode))
+
+
+# ================= TRANSACTION WRITES =================
+class TransactionWriteMixin(LoginRequiredMixin):
+    """
+    Shared create/edit path for expenses and incomes.
+
+    The row goes out as a single INSERT or UPDATE in one atomic block; derived
+    data (stats, counters, caches) is updated from ``on_saved`` once that
+    block has committed.
+    """
     login_url = '/login/'
+    previous = None
+
+    def get_queryset(self):
+        # Owner-scoped, and annotated so an edit knows the stored base amount without another query
+        return in_base_currency(self.model.objects.filter(user=self.request.user))
+
+    def get_object(self, queryset=None):
+        obj = super().get_object(queryset)
+        # Taken before the form copies the submitted values onto the instance
+        self.previous = self.snapshot(obj)
+        return obj
 
     def form_valid(self, form):
         obj = form.save(commit=False)
         if obj.date > date.today():
             return self.form_invalid(form)
         obj.user = self.request.user
-        obj.save()
-        return super().form_valid(form)
+        self.prepare(obj)
+        previous = self.previous
+        with transaction.atomic():
+            obj.save()
+            transaction.on_commit(lambda: self.on_saved(obj, previous))
+        self.object = obj
+        return redirect(self.get_success_url())
+
+    def snapshot(self, obj):
+        """Values of the stored row that ``on_saved`` needs to undo; None on create."""
+        return None
+
+    def prepare(self, obj):
+        """Fill derived columns before the write. Must not write itself."""
+
+    def on_saved(self, obj, previous):
+        """Post-commit hook for derived data."""
+        data_version.bump(obj.user_id, kinds=[self.model._meta.model_name])
+
+
+# ================= EXPENSE CBVs =================
+class ExpenseBaseMixin(TransactionWriteMixin):
+    model = Expense
+    form_class = ExpenseForm
+
+    def snapshot(self, obj):
+        return (obj.category_id, obj.base_amount, obj.date)
+
+    def prepare(self, obj):
+        attach_base_amounts([obj])
+        AnomalyDetector(obj.user).flag(obj, previous=self.previous)
+
+    def on_saved(self, obj, previous):
+        super().on_saved(obj, previous)
+        AnomalyDetector(obj.user).record(obj, previous=previous[:2] if previous else None)
+        tracker = BudgetTracker(obj.user)
+        tracker.record(obj, previous=previous)
+        warning = tracker.check(obj.category_id, obj.date)
+        if warning:
+            messages.warning(self.request, warning)
 
 
 class ExpenseCreateView(ExpenseBaseMixin, CreateView):
@@ -292,25 +614,26 @@ class ExpenseDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('dashboard')
     login_url = '/login/'
 
+    def get_queryset(self):
+        return in_base_currency(Expense.objects.filter(user=self.request.user))
+
     def get(self, request, *args, **kwargs):
         obj = self.get_object()
-        obj.delete()
+        with transaction.atomic():
+            Expense.objects.filter(pk=obj.pk).soft_delete()
+            transaction.on_commit(lambda: self.on_deleted(obj))
         return redirect(self.success_url)
 
+    def on_deleted(self, obj):
+        data_version.bump(obj.user_id, kinds=['expense'])
+        AnomalyDetector(obj.user).discard(obj.category_id, obj.base_amount)
+        BudgetTracker(obj.user).discard(obj.category_id, obj.base_amount, obj.date)
+
 
 # ================= INCOME CBVs =================
-class IncomeBaseMixin(LoginRequiredMixin):
+class IncomeBaseMixin(TransactionWriteMixin):
     model = Income
     form_class = IncomeForm
-    login_url = '/login/'
-
-    def form_valid(self, form):
-        obj = form.save(commit=False)
-        if obj.date > date.today():
-            return self.form_invalid(form)
-        obj.user = self.request.user
-        obj.save()
-        return super().form_valid(form)
 
 
 class IncomeCreateView(IncomeBaseMixin, CreateView):
@@ -328,13 +651,155 @@ class IncomeDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('dashboard')
     login_url = '/login/'
 
+    def get_queryset(self):
+        return Income.objects.filter(user=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        obj = self.get_object()
+        with transaction.atomic():
+            Income.objects.filter(pk=obj.pk).soft_delete()
+            data_version.bump(obj.user_id, kinds=['income'])
+        return redirect(self.success_url)
+
+
+# ================= RECURRING RULE CBVs =================
+class RecurringRuleCreateView(LoginRequiredMixin, CreateView):
+    model = RecurringRule
+    form_class = RecurringRuleForm
+    template_name = 'recurring_rules.html'
+    success_url = reverse_lazy('recurring_rules')
+    login_url = '/login/'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['rules'] = (
+            RecurringRule.objects.filter(user=self.request.user)
+                                 .select_related('category')
+                                 .order_by('-active', 'next_run')
+        )
+        return context
+
+    def form_valid(self, form):
+        form.instance.user = self.request.user
+        return super().form_valid(form)
+
+
+class RecurringRuleDeleteView(LoginRequiredMixin, DeleteView):
+    model = RecurringRule
+    success_url = reverse_lazy('recurring_rules')
+    login_url = '/login/'
+
+    def get_queryset(self):
+        return RecurringRule.objects.filter(user=self.request.user)
+
     def get(self, request, *args, **kwargs):
         obj = self.get_object()
         obj.delete()
         return redirect(self.success_url)
 
 
+# ================= CATEGORY BUDGET CBVs =================
+class CategoryBudgetCreateView(LoginRequiredMixin, CreateView):
+    model = CategoryBudget
+    form_class = CategoryBudgetForm
+    template_name = 'category_budgets.html'
+    success_url = reverse_lazy('category_budgets')
+    login_url = '/login/'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['budgets'] = BudgetTracker(self.request.user).status(date.today())
+        return context
+
+    def form_valid(self, form):
+        # One budget per category: setting it again replaces the limit
+        CategoryBudget.objects.update_or_create(
+            user=self.request.user,
+            category=form.cleaned_data['category'],
+            defaults={'monthly_limit': form.cleaned_data['monthly_limit']},
+        )
+        return redirect(self.success_url)
+
+
+class CategoryBudgetDeleteView(LoginRequiredMixin, DeleteView):
+    model = CategoryBudget
+    success_url = reverse_lazy('category_budgets')
+    login_url = '/login/'
+
+    def get_queryset(self):
+        return CategoryBudget.objects.filter(user=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        obj = self.get_object()
+        obj.delete()
+        return redirect(self.success_url)
+
+
+# ================= CURRENCY PREFERENCE =================
+class CurrencyPreferenceView(LoginRequiredMixin, UpdateView):
+    model = CurrencyPreference
+    form_class = CurrencyPreferenceForm
+    template_name = 'currency_preference.html'
+    success_url = reverse_lazy('dashboard')
+    login_url = '/login/'
+
+    def get_object(self, queryset=None):
+        preference, _ = CurrencyPreference.objects.get_or_create(user=self.request.user)
+        return preference
+
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        # Stats and counters are kept in the base currency, so they follow it
+        AnomalyDetector.rebuild(user=self.request.user)
+        BudgetTracker.rebuild(user=self.request.user)
+        data_version.bump(self.request.user.id)
+        return response
+
+
+# ================= SYNC API =================
+class TransactionBatchView(LoginRequiredMixin, View):
+    """
+    Apply up to BATCH_WRITE_MAX_OPERATIONS expense/income operations in one request:
+    {"operations": [{"op": "create", "type": "expense", "key": "...", "data": {...}}, ...]}
+    """
+    login_url = '/login/'
+
+    def post(self, request, *args, **kwargs):
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'errors': [{'index': None, 'errors': {'body': ['Invalid JSON.']}}]}, status=400)
+        operations = payload.get('operations') if isinstance(payload, dict) else None
+
+        try:
+            results = BatchWriter(request.user).apply(operations)
+        except BatchError as exc:
+            return JsonResponse({'errors': exc.errors}, status=400)
+        except IntegrityError:
+            # A concurrent retry with the same idempotency key won the race
+            return JsonResponse({'errors': [{'index': None, 'errors': {
+                'key': ['This batch is already being applied; retry to receive its results.']
+            }}]}, status=409)
+        return JsonResponse({'results': results})
+
+
+class ChangesView(LoginRequiredMixin, View):
+    """Rows changed after ?since=<cursor>, with tombstones for deletes; no cursor means full sync."""
+    login_url = '/login/'
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.GET.get('limit') or settings.SYNC_PAGE_SIZE), settings.SYNC_PAGE_SIZE)
+            page = ChangeFeed(request.user, page_size=max(limit, 1)).page(request.GET.get('since'))
+        except CursorExpired:
+            return JsonResponse({'reset': True, 'detail': 'Cursor expired; sync again without since.'}, status=410)
+        except ValueError:
+            return JsonResponse({'detail': 'Invalid cursor or limit.'}, status=400)
+        return JsonResponse(page)
+
+
 # ================= REPORTS CBV =================
+@method_decorator(read_from_replica, name='dispatch')
 class ReportsView(LoginRequiredMixin, TemplateView):
     template_name = 'reports.html'
     login_url = '/login/'
@@ -345,136 +810,183 @@ class ReportsView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         user = self.request.user
 
-        base_expenses = Expense.objects.filter(user=user)
-        base_incomes = Income.objects.filter(user=user)
+        base_expenses = in_base_currency(Expense.objects.filter(user=user))
+        base_incomes = in_base_currency(Income.objects.filter(user=user))
+        archived = in_base_currency(ArchivedSummary.objects.filter(user=user))
+        # (expenses, incomes) pairs: totals of archived rows first, then live rows
+        base_sources = [
+            (archived.filter(kind=ArchivedSummary.EXPENSE), archived.filter(kind=ArchivedSummary.INCOME)),
+            (base_expenses, base_incomes),
+        ]
 
         # ---------------- FILTER PARAMETERS ----------------
         weekly_month = self.request.GET.get('weekly_month')      # YYYY-MM
         monthly_year = self.request.GET.get('monthly_year')      # YYYY
         category_month = self.request.GET.get('category_month')  # YYYY-MM
+        calendar_mode = self.request.GET.get('calendar', 'ad')   # 'ad' or 'bs'
 
+        # Summaries are lazy: each is only computed when its table misses the fragment cache
         # ---------------- WEEKLY SUMMARY ----------------
-        weekly_expenses = base_expenses
-        weekly_incomes = base_incomes
+        weekly_sources = base_sources
         if weekly_month:
             y, m = map(int, weekly_month.split('-'))
-            weekly_expenses = weekly_expenses.filter(date__year=y, date__month=m)
-            weekly_incomes = weekly_incomes.filter(date__year=y, date__month=m)
-        context['weekly_summary'] = ReportsHelper.combine_summary(
-            weekly_expenses, weekly_incomes, None, 'week'
-        )
+            weekly_sources = filter_sources(weekly_sources, date__year=y, date__month=m)
+        context['weekly_summary'] = SimpleLazyObject(lambda: ReportsHelper.summarize(
+            weekly_sources, ReportsHelper.combine_summary, None, 'week'
+        ))
         context['selected_weekly_month'] = weekly_month
 
         # ---------------- MONTHLY SUMMARY ----------------
-        monthly_expenses = base_expenses
-        monthly_incomes = base_incomes
-        if monthly_year:
-            y = int(monthly_year)
-            monthly_expenses = monthly_expenses.filter(date__year=y)
-            monthly_incomes = monthly_incomes.filter(date__year=y)
-        monthly_summary = ReportsHelper.combine_summary(
-            monthly_expenses, monthly_incomes, TruncMonth, 'month'
-        )
+        monthly_sources = base_sources
+        if calendar_mode == 'bs':
+            # In BS mode the year filter selects a Nepali fiscal year
+            if monthly_year:
+                monthly_sources = filter_sources(monthly_sources, calendar__fiscal_year=int(monthly_year))
+            monthly_summary = SimpleLazyObject(lambda: ReportsHelper.summarize(
+                monthly_sources, ReportsHelper.combine_bs_summary, 'month'
+            ))
+        else:
+            if monthly_year:
+                monthly_sources = filter_sources(monthly_sources, date__year=int(monthly_year))
+            monthly_summary = SimpleLazyObject(lambda: ReportsHelper.summarize(
+                monthly_sources, ReportsHelper.combine_summary, TruncMonth, 'month'
+            ))
         context['monthly_summary'] = monthly_summary
         context['selected_monthly_year'] = monthly_year
 
         # ---------------- YEARLY SUMMARY ----------------
-        yearly_expenses = base_expenses
-        yearly_incomes = base_incomes
-        yearly_summary = ReportsHelper.combine_summary(
-            yearly_expenses, yearly_incomes, TruncYear, 'year'
-        )
+        if calendar_mode == 'bs':
+            yearly_summary = SimpleLazyObject(lambda: ReportsHelper.summarize(
+                base_sources, ReportsHelper.combine_bs_summary, 'fiscal_year'
+            ))
+        else:
+            yearly_summary = SimpleLazyObject(lambda: ReportsHelper.summarize(
+                base_sources, ReportsHelper.combine_summary, TruncYear, 'year'
+            ))
         context['yearly_summary'] = yearly_summary
 
         # ---------------- CATEGORY SUMMARY ----------------
-        category_expenses = base_expenses
+        category_sources = base_sources
         if category_month:
             y, m = map(int, category_month.split('-'))
-            category_expenses = category_expenses.filter(date__year=y, date__month=m)
-        expense_category = (
-            category_expenses.values('category__name')
-                             .annotate(total=Sum('amount'))
-                             .order_by('-total')
+            category_sources = filter_sources(category_sources, date__year=y, date__month=m)
+        expense_category = SimpleLazyObject(
+            lambda: ReportsHelper.category_totals(exp_qs for exp_qs, _ in category_sources)
         )
         context['expense_category'] = expense_category
         context['selected_category_month'] = category_month
 
         # ---------------- JSON FOR CHART.JS ----------------
-        context['weekly_summary_json'] = json.dumps(context['weekly_summary'], cls=DjangoJSONEncoder)
-        context['monthly_summary_json'] = json.dumps(context['monthly_summary'], cls=DjangoJSONEncoder)
-        context['yearly_summary_json'] = json.dumps(context['yearly_summary'], cls=DjangoJSONEncoder)
-        context['expense_category_json'] = json.dumps(list(expense_category), cls=DjangoJSONEncoder)
+        # Rendered inside the same fragments as the tables they chart
+        for name in ('weekly_summary', 'monthly_summary', 'yearly_summary', 'expense_category'):
+            context[f'{name}_json'] = SimpleLazyObject(
+                lambda summary=context[name]: json.dumps(list(summary), cls=DjangoJSONEncoder)
+            )
 
         # ---------------- DROPDOWN OPTIONS ----------------
-        context['all_months'] = base_expenses.dates('date', 'month', order='DESC')
-        context['all_years'] = base_expenses.dates('date', 'year', order='DESC')
+        archived_expenses = base_sources[0][0]
+        context['all_months'] = sorted(
+            set(base_expenses.dates('date', 'month')) | set(archived_expenses.dates('date', 'month')),
+            reverse=True,
+        )
+        context['all_years'] = sorted(
+            set(base_expenses.dates('date', 'year')) | set(archived_expenses.dates('date', 'year')),
+            reverse=True,
+        )
+        fiscal_years = set()
+        for exp_qs in (base_expenses, archived_expenses):
+            fiscal_years.update(
+                exp_qs.exclude(calendar__fiscal_year=None)
+                      .values_list('calendar__fiscal_year', flat=True).distinct()
+            )
+        context['all_fiscal_years'] = [
+            {'value': fy, 'label': fiscal_year_label(fy)} for fy in sorted(fiscal_years, reverse=True)
+        ]
+        context['calendar_mode'] = calendar_mode
 
         return context
 
 # ================= PDF REPORT CBV =================
+@method_decorator(read_from_replica, name='dispatch')
 class ReportsPDFView(LoginRequiredMixin, View):
     login_url = '/login/'
 
     def get(self, request, *args, **kwargs):
         user = request.user
-        expenses = Expense.objects.filter(user=user)
-        incomes = Income.objects.filter(user=user)
-
-        weekly_summary = ReportsHelper.combine_summary(expenses, incomes, TruncWeek, 'week')
-        monthly_summary = ReportsHelper.combine_summary(expenses, incomes, TruncMonth, 'month')
-        yearly_summary = ReportsHelper.combine_summary(expenses, incomes, TruncYear, 'year')
-
-        expense_category = (
-            expenses.values('category__name')
-                    .annotate(total=Sum('amount'))
-                    .order_by('-total')
-        )
-
-        # ✅ WEEKLY CHART → LINE GRAPH
-        weekly_chart = ChartGenerator('Weekly Income vs Expense', 'line').plot(
-            [w['period'] for w in weekly_summary],
-            [
-                {'label': 'Expenses', 'data': [w['expenses'] for w in weekly_summary], 'color': 'red'},
-                {'label': 'Incomes', 'data': [w['incomes'] for w in weekly_summary], 'color': 'green'}
-            ]
-        )
+        expenses = in_base_currency(Expense.objects.filter(user=user))
+        incomes = in_base_currency(Income.objects.filter(user=user))
+        archived = in_base_currency(ArchivedSummary.objects.filter(user=user))
+        sources = [
+            (archived.filter(kind=ArchivedSummary.EXPENSE), archived.filter(kind=ArchivedSummary.INCOME)),
+            (expenses, incomes),
+        ]
+
+        weekly_summary = ReportsHelper.summarize(sources, ReportsHelper.combine_summary, TruncWeek, 'week')
+        if request.GET.get('calendar') == 'bs':
+            monthly_summary = ReportsHelper.summarize(sources, ReportsHelper.combine_bs_summary, 'month')
+            yearly_summary = ReportsHelper.summarize(sources, ReportsHelper.combine_bs_summary, 'fiscal_year')
+        else:
+            monthly_summary = ReportsHelper.summarize(sources, ReportsHelper.combine_summary, TruncMonth, 'month')
+            yearly_summary = ReportsHelper.summarize(sources, ReportsHelper.combine_summary, TruncYear, 'year')
+
+        expense_category = ReportsHelper.category_totals(exp_qs for exp_qs, _ in sources)
+
+        # Charts are written as files next to the PDF being built and linked by
+        # name; without xhtml2pdf the HTML fallback needs them inline instead.
+        fmt = settings.PDF_CHART_FORMAT
+        with tempfile.TemporaryDirectory(prefix='report-charts-') as tmp:
+            charts = tmp if PDFRenderer.available() else None
+            # ✅ WEEKLY CHART → LINE GRAPH
+            weekly_chart = ChartGenerator('Weekly Income vs Expense', 'line', fmt=fmt).plot(
+                [w['period'] for w in weekly_summary],
+                [
+                    {'label': 'Expenses', 'data': [w['expenses'] for w in weekly_summary], 'color': 'red'},
+                    {'label': 'Incomes', 'data': [w['incomes'] for w in weekly_summary], 'color': 'green'}
+                ],
+                directory=charts,
+            )
 
-        # ✅ MONTHLY CHART → BAR GRAPH
-        monthly_chart = ChartGenerator('Monthly Income vs Expense', 'bar').plot(
-            [m['period'] for m in monthly_summary],
-            [
-                {'label': 'Expenses', 'data': [m['expenses'] for m in monthly_summary], 'color': 'red'},
-                {'label': 'Incomes', 'data': [m['incomes'] for m in monthly_summary], 'color': 'green'}
-            ]
-        )
+            # ✅ MONTHLY CHART → BAR GRAPH
+            monthly_chart = ChartGenerator('Monthly Income vs Expense', 'bar', fmt=fmt).plot(
+                [m['period'] for m in monthly_summary],
+                [
+                    {'label': 'Expenses', 'data': [m['expenses'] for m in monthly_summary], 'color': 'red'},
+                    {'label': 'Incomes', 'data': [m['incomes'] for m in monthly_summary], 'color': 'green'}
+                ],
+                directory=charts,
+            )
 
-        # YEARLY CHART (no change)
-        yearly_chart = ChartGenerator('Yearly Income vs Expense', 'bar').plot(
-            [y['period'] for y in yearly_summary],
-            [
-                {'label': 'Expenses', 'data': [y['expenses'] for y in yearly_summary], 'color': 'orange'},
-                {'label': 'Incomes', 'data': [y['incomes'] for y in yearly_summary], 'color': 'blue'}
-            ]
-        )
+            # YEARLY CHART (no change)
+            yearly_chart = ChartGenerator('Yearly Income vs Expense', 'bar', fmt=fmt).plot(
+                [y['period'] for y in yearly_summary],
+                [
+                    {'label': 'Expenses', 'data': [y['expenses'] for y in yearly_summary], 'color': 'orange'},
+                    {'label': 'Incomes', 'data': [y['incomes'] for y in yearly_summary], 'color': 'blue'}
+                ],
+                directory=charts,
+            )
 
-        # CATEGORY PIE CHART (same)
-        category_chart = ChartGenerator('Expenses by Category', 'pie').plot(
-            [c['category__name'] for c in expense_category],
-            [{
-                'data': [c['total'] for c in expense_category],
-                'colors': ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF']
-            }]
-        )
+            # CATEGORY PIE CHART (same)
+            category_chart = ChartGenerator('Expenses by Category', 'pie', fmt=fmt).plot(
+                [c['category__name'] for c in expense_category],
+                [{
+                    'data': [c['total'] for c in expense_category],
+                    'colors': ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF']
+                }],
+                directory=charts,
+            )
 
-        context = {
-            'weekly_summary': weekly_summary,
-            'monthly_summary': monthly_summary,
-            'yearly_summary': yearly_summary,
-            'expense_category': expense_category,
-            'weekly_chart': weekly_chart,
-            'monthly_chart': monthly_chart,
-            'yearly_chart': yearly_chart,
-            'category_chart': category_chart,
-        }
+            context = {
+                'weekly_summary': weekly_summary,
+                'monthly_summary': monthly_summary,
+                'yearly_summary': yearly_summary,
+                'expense_category': expense_category,
+                'weekly_chart': weekly_chart,
+                'monthly_chart': monthly_chart,
+                'yearly_chart': yearly_chart,
+                'category_chart': category_chart,
+                # PDFs are rendered without a request, so context processors don't run
+                **currency_context(request),
+            }
 
-        return PDFRenderer('reports_pdf.html', context).render()
\ No newline at end of file
+            return PDFRenderer('reports_pdf.html', context, asset_dir=charts).render()
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+Worker warm-up.
+
+The first request a new worker serves pays for everything Django and the
+views load lazily: importing the URLconf and core_app.views (and matplotlib
+with it), compiling templates, building matplotlib's font list and Agg
+renderer, importing xhtml2pdf/reportlab, connecting to the database and
+filling the category caches. ``warm_up()`` does that work at boot instead.
+
+``Sika_ved.wsgi`` calls it when the module is imported (each worker, or the
+master with ``gunicorn --preload``); ``Sika_ved.asgi`` wraps the application
+in ``WarmUpLifespan``, which runs it on the server's lifespan startup event.
+Both are switched by ``settings.WARM_UP_ON_BOOT`` and run the steps listed in
+``settings.WARM_UP_STEPS``.
+
+Connections opened during the warm-up are only kept when the 'database' step
+is requested; they outlive the first request only with persistent connections
+(``CONN_MAX_AGE``). Leave 'database' out where the application is imported
+before the server forks (``--preload``): workers must not share a connection.
+Under ASGI each request runs in its own thread with its own connection, so
+there the step only checks that the database is reachable.
+"""
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import resolve, reverse
+
+logger = logging.getLogger(__name__)
+
+# Pages whose first render is warmed; base.html is loaded by {% extends %} at render time
+TEMPLATES = ('base.html', 'dashboard.html', 'reports.html', 'reports_pdf.html', 'statement_pdf.html')
+URL_NAMES = ('dashboard', 'reports', 'reports_pdf')
+
+
+def _urls():
+    # Importing the URLconf imports core_app.views, and matplotlib with it
+    for name in URL_NAMES:
+        resolve(reverse(name))
+
+
+def _templates():
+    # The cached loader keeps the compiled templates (and their tag libraries) for the process
+    for name in TEMPLATES:
+        get_template(name)
+
+
+def _charts():
+    from core_app.views import ChartGenerator
+
+    # Drawing text builds matplotlib's font list and loads DejaVu Sans into the Agg renderer
+    for fmt in {'png', settings.PDF_CHART_FORMAT}:
+        ChartGenerator('Warm-up', 'bar', figsize=(1, 1), fmt=fmt).plot(
+            ['a'], [{'label': 'a', 'data': [1], 'color': 'red'}]
+        )
+
+
+def _pdf():
+    from core_app.views import PDFRenderer
+
+    if PDFRenderer.available():
+        # Imports xhtml2pdf and reportlab and loads the PDF's standard fonts
+        PDFRenderer('statement_pdf.html', {}).render()
+
+
+def _database():
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def _categories():
+    from core_app.category_cache import categories, income_categories
+
+    categories.all()
+    income_categories.all()
+
+
+STEPS = {
+    'urls': _urls,
+    'templates': _templates,
+    'charts': _charts,
+    'pdf': _pdf,
+    'database': _database,
+    'categories': _categories,
+}
+
+
+def warm_up(steps=None):
+    """
+    Run the warm-up steps in order. A failing step is logged and skipped:
+    the worker still starts, its first request is just slower.
+
+    :param steps: step names from STEPS (default: settings.WARM_UP_STEPS)
+    :return: {step: seconds} for the steps that completed
+    """
+    steps = list(settings.WARM_UP_STEPS if steps is None else steps)
+    unknown = [name for name in steps if name not in STEPS]
+    if unknown:
+        raise ValueError(f"Unknown warm-up step(s) {', '.join(unknown)}; choose from {', '.join(STEPS)}.")
+
+    timings = {}
+    for name in steps:
+        started = time.perf_counter()
+        try:
+            STEPS[name]()
+        except Exception:
+            logger.exception('Warm-up step %s failed', name)
+            continue
+        timings[name] = round(time.perf_counter() - started, 4)
+    if 'database' not in steps:
+        # Other steps may have connected (categories); don't hand that connection to forked workers
+        connections.close_all()
+    logger.info('Worker warmed up in %.2fs: %s', sum(timings.values()), timings)
+    return timings
+
+
+class WarmUpLifespan:
+    """
+    ASGI wrapper that runs ``warm_up()`` when the server sends the lifespan
+    startup event; Django's own handler only accepts HTTP scopes. Servers
+    without lifespan support (or with it disabled) skip the warm-up.
+    """
+
+    def __init__(self, application, steps=None):
+        self.application = application
+        self.steps = steps
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'lifespan':
+            return await self.application(scope, receive, send)
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await sync_to_async(warm_up)(self.steps)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return